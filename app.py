@@ -1,16 +1,30 @@
-from flask import Flask, redirect, url_for, session, render_template, request
+from flask import Flask, redirect, url_for, session, render_template, request, jsonify, g, abort
 from flask_discord import DiscordOAuth2Session, Unauthorized
-from db import SessionLocal
-from models import User
+from sqlalchemy import func
+from db import pool_stats
+from web_db import get_db, init_app as init_db_session
+from assets import init_app as init_assets
+from models import User, StatSnapshot
 from routes.queue import bp as queue_bp
-from auth import requires_login
+from auth import requires_login, refresh_identity, clear_identity
+from hiscores import get_hiscores, parse_lite, combat_level
+from rollups import gains_for_period, PERIODS
+from leaderboards import clan_leaderboards, METRICS, GAIN_METRICS
+from queue_ops import bump_hosted_queues
+import hmac
 import os
 import traceback
-import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key-change-me")
+init_db_session(app)
+init_assets(app)
+
+# Snapshots younger than this are rendered instead of hitting the hiscores
+STATS_SNAPSHOT_MAX_AGE = int(os.getenv("STATS_SNAPSHOT_MAX_AGE", 3900))
+# Shared secret for /health/db (Authorization: Bearer <token>); unset disables it
+HEALTH_TOKEN = os.getenv("HEALTH_TOKEN")
 
 # ---------------- Discord OAuth ----------------
 app.config["DISCORD_CLIENT_ID"] = os.getenv("DISCORD_CLIENT_ID")
@@ -38,7 +52,7 @@ def login():
 def callback():
     try:
         discord.callback()
-        user = discord.fetch_user()
+        user = refresh_identity()
         print(f"Logged in: {user.name} ({user.id})")
     except Exception:
         traceback.print_exc()
@@ -49,11 +63,11 @@ def callback():
 @app.route("/dashboard/")
 @requires_login
 def dashboard():
-    user = discord.fetch_user()
-    return render_template("dashboard.html", user=user)
+    return render_template("dashboard.html", user=g.user)
 
 @app.route("/logout/")
 def logout():
+    clear_identity()
     discord.revoke()
     return redirect(url_for("index"))
 
@@ -68,22 +82,17 @@ def redirect_unauthorized(e):
 def link_rsn():
     if request.method == "POST":
         rsn = request.form.get("rsn")
-        user = discord.fetch_user()
-
-        hs_url = f"https://secure.runescape.com/m=hiscore_oldschool/index_lite.ws?player={rsn}"
-        response = requests.get(hs_url)
-
-        if response.status_code == 200:
-            db = SessionLocal()
-            try:
-                existing = db.query(User).filter_by(discord_id=str(user.id)).first()
-                if existing:
-                    existing.rsn = rsn
-                else:
-                    db.add(User(discord_id=str(user.id), rsn=rsn))
-                db.commit()
-            finally:
-                db.close()
+        user = g.user
+
+        if get_hiscores(rsn) is not None:
+            db = get_db()
+            existing = db.query(User).filter_by(discord_id=str(user.id)).first()
+            if existing:
+                existing.rsn = rsn
+                bump_hosted_queues(db, str(user.id))
+            else:
+                db.add(User(discord_id=str(user.id), rsn=rsn))
+            db.commit()
 
             return redirect(url_for("view_stats"))
 
@@ -98,65 +107,112 @@ def link_rsn():
 def view_stats():
     # If ?rsn=Someone is passed in the URL, view their stats
     target_rsn = request.args.get("rsn")
-    
+    skills = None
+    kill_counts = {}
+
+    db = get_db()
     if target_rsn:
         rsn = target_rsn
+        user_entry = db.query(User).filter(func.lower(User.rsn) == rsn.lower()).first()
     else:
         # Otherwise, fall back to the logged-in user's linked RSN
-        user = discord.fetch_user()
-        db = SessionLocal()
-        try:
-            user_entry = db.query(User).filter_by(discord_id=str(user.id)).first()
-            if not user_entry:
-                return redirect(url_for("link_rsn"))
-            rsn = user_entry.rsn
-        finally:
-            db.close()
-
-    hs_url = f"https://secure.runescape.com/m=hiscore_oldschool/index_lite.ws?player={rsn}"
-    response = requests.get(hs_url)
-
-    if response.status_code != 200:
-        return "Error fetching stats.", 500
-
-    lines = response.text.splitlines()
+        user = g.user
+        user_entry = db.query(User).filter_by(discord_id=str(user.id)).first()
+        if not user_entry:
+            return redirect(url_for("link_rsn"))
+        rsn = user_entry.rsn
+
+    # Linked players are collected in the background, so prefer a recent snapshot
+    if user_entry:
+        cutoff = datetime.utcnow() - timedelta(seconds=STATS_SNAPSHOT_MAX_AGE)
+        snapshot = (
+            db.query(StatSnapshot)
+            .filter(StatSnapshot.user_id == user_entry.id, StatSnapshot.timestamp >= cutoff)
+            .order_by(StatSnapshot.timestamp.desc())
+            .first()
+        )
+        if snapshot:
+            skills = snapshot.skills
+            kill_counts = snapshot.kill_counts
+    # Hand the connection back to the pool before a possibly slow hiscore fetch
+    db.close()
+
+    if skills is None:
+        hiscore_text = get_hiscores(rsn)
+        if hiscore_text is None:
+            return "Error fetching stats.", 500
+        record = parse_lite(hiscore_text)
+        skills = record.skill_dict()
+        kill_counts = record.kill_counts()
+
     parsed_stats = {}
+    for skill, data in skills.items():
+        parsed_stats[skill] = {
+            key: ("N/A" if data.get(key) is None else data[key]) for key in ("level", "xp", "rank")
+        }
+
+    parsed_stats["Combat Level"] = combat_level(parsed_stats)
+    return render_template("stats.html", rsn=rsn, stats=parsed_stats, kill_counts=kill_counts)
 
-    skill_names = [
-        "Overall", "Attack", "Defence", "Strength", "Hitpoints", "Ranged",
-        "Prayer", "Magic", "Cooking", "Woodcutting", "Fletching", "Fishing",
-        "Firemaking", "Crafting", "Smithing", "Mining", "Herblore", "Agility",
-        "Thieving", "Slayer", "Farming", "Runecraft", "Hunter", "Construction"
-    ]
+@app.route("/stats/<rsn>/gains")
+@requires_login
+def view_gains(rsn):
+    period = request.args.get("period", "week")
+    if period not in PERIODS:
+        return jsonify(error=f"Unknown period. Use one of: {', '.join(PERIODS)}"), 400
 
-    for i, skill in enumerate(skill_names):
-        try:
-            rank, level, xp = lines[i].split(",")
-            parsed_stats[skill] = {"level": level, "xp": xp, "rank": rank}
-        except:
-            parsed_stats[skill] = {"level": "N/A", "xp": "N/A", "rank": "N/A"}
+    db = get_db()
+    user_entry = db.query(User).filter(func.lower(User.rsn) == rsn.lower()).first()
+    if not user_entry:
+        return jsonify(error="RSN is not linked, so no history is tracked."), 404
+    since, gains = gains_for_period(db, user_entry.id, period)
 
-    parsed_stats["Combat Level"] = combat_level(parsed_stats)
-    return render_template("stats.html", rsn=rsn, stats=parsed_stats)
+    return jsonify(rsn=user_entry.rsn, period=period, since=since.isoformat(), gains=gains)
 
-def combat_level(stats):
-    try:
-        attack = int(stats["Attack"]["level"])
-        strength = int(stats["Strength"]["level"])
-        defence = int(stats["Defence"]["level"])
-        hitpoints = int(stats["Hitpoints"]["level"])
-        prayer = int(stats["Prayer"]["level"])
-        ranged = int(stats["Ranged"]["level"])
-        magic = int(stats["Magic"]["level"])
-
-        base = 0.25 * (defence + hitpoints + (prayer // 2))
-        melee = 0.325 * (attack + strength)
-        range = 0.325 * (ranged * 1.5)
-        mage = 0.325 * (magic * 1.5)
-
-        return round(base + max(melee, range, mage), 2)
-    except:
-        return "N/A"
+# ---------------- Leaderboards ----------------
+
+@app.route("/leaderboards")
+@requires_login
+def view_leaderboards():
+    metric = request.args.get("metric", "Overall")
+    period = request.args.get("period", "all")
+    if metric not in METRICS:
+        metric = "Overall"
+    if period not in PERIODS or metric not in GAIN_METRICS:
+        period = "all"
+
+    user = g.user
+    db = get_db()
+    user_entry = db.query(User).filter_by(discord_id=str(user.id)).first()
+    rows, my_rank, total = clan_leaderboards.query(
+        db, metric, period, k=50, user_id=user_entry.id if user_entry else None
+    )
+    names = dict(db.query(User.id, User.rsn).filter(User.id.in_([r[1] for r in rows])).all())
+
+    entries = [{"rank": rank, "rsn": names.get(uid, "Unknown"), "score": score} for rank, uid, score in rows]
+    return render_template(
+        "leaderboards.html",
+        entries=entries,
+        metric=metric,
+        period=period,
+        metrics=METRICS,
+        periods=["all"] + list(PERIODS),
+        my_rank=my_rank,
+        total=total,
+    )
+
+# ---------------- Health ----------------
+
+@app.route("/health/db")
+def db_health():
+    # Connection pool usage for this worker; see db.py for the sizing knobs.
+    # For monitoring only, so it takes a shared secret rather than a Discord login.
+    if not HEALTH_TOKEN:
+        abort(404)
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), HEALTH_TOKEN.encode()):
+        abort(403)
+    return jsonify(pid=os.getpid(), **pool_stats())
 
 @app.context_processor
 def inject_now():
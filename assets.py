@@ -0,0 +1,101 @@
+# assets.py
+#
+# Template helpers for the fingerprinted files built by build_assets.py, and
+# the /assets route that serves them:
+#
+#   {{ asset_url("css/style.css") }}
+#   {{ picture("img/bosscape_banner.png", "Bosscape Banner", sizes="100vw", class="hero-img") }}
+#
+# Hashed names never change content, so responses are cacheable forever.
+# Precompressed .br/.gz copies are sent when the browser accepts them. Without
+# static/dist/manifest.json every helper falls back to the plain static file.
+
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_from_directory, url_for
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+_manifest = None
+
+
+def manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(DIST_DIR, MANIFEST)) as f:
+                _manifest = json.load(f)
+        except FileNotFoundError:
+            print(f"[Assets] No {MANIFEST} in {DIST_DIR}; serving unbuilt static files")
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(path, width=None):
+    # Hashed URL of a static file; ``width`` picks an image's fallback variant of at most that width
+    entry = manifest().get(path)
+    if entry is None:
+        return url_for("static", filename=path)
+    name = entry["file"]
+    if width and "variants" in entry:
+        fitting = [n for w, n in entry["variants"][entry["fallback"]] if w <= width]
+        name = fitting[-1] if fitting else entry["variants"][entry["fallback"]][0][1]
+    return url_for("assets", filename=name)
+
+
+def _srcset(variants):
+    return ", ".join(f"{url_for('assets', filename=name)} {width}w" for width, name in variants)
+
+
+def picture(path, alt, sizes="100vw", **attrs):
+    # <picture> with AVIF/WebP sources and a JPEG/PNG <img>; ``attrs`` go on the <img>
+    entry = manifest().get(path)
+    img_attrs = "".join(f' {escape(k.rstrip("_"))}="{escape(v)}"' for k, v in attrs.items())
+    if entry is None or "variants" not in entry:
+        return Markup(f'<img src="{escape(asset_url(path))}" alt="{escape(alt)}"{img_attrs}>')
+
+    sources = "".join(
+        f'<source type="{MIME_TYPES[fmt]}" srcset="{escape(_srcset(variants))}" sizes="{escape(sizes)}">'
+        for fmt, variants in entry["variants"].items() if fmt != entry["fallback"]
+    )
+    fallback = entry["variants"][entry["fallback"]]
+    return Markup(
+        f'<picture>{sources}<img src="{escape(url_for("assets", filename=fallback[-1][1]))}" '
+        f'srcset="{escape(_srcset(fallback))}" sizes="{escape(sizes)}" '
+        f'width="{entry["width"]}" height="{entry["height"]}" alt="{escape(alt)}"{img_attrs}></picture>'
+    )
+
+
+def serve_asset(filename):
+    path = safe_join(DIST_DIR, filename)
+    if path is None or not os.path.isfile(path) or filename == MANIFEST:
+        abort(404)
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+        if accepted[encoding] and os.path.isfile(path + suffix):
+            # Typed as the original file, not as the .br/.gz wrapper
+            response = send_from_directory(
+                DIST_DIR, filename + suffix, mimetype=mimetypes.guess_type(filename)[0], max_age=0
+            )
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, max_age=0)
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app):
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.add_template_global(asset_url)
+    app.add_template_global(picture)
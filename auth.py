@@ -1,7 +1,50 @@
 # auth.py
 
-from flask import redirect, url_for, current_app
+from flask import redirect, url_for, current_app, session, g
 from functools import wraps
+import os
+import time
+
+# How long the Discord identity cached in the session is trusted (seconds)
+IDENTITY_TTL = int(os.getenv("DISCORD_IDENTITY_TTL", 900))
+SESSION_KEY = "discord_identity"
+
+
+class SessionUser:
+    # The subset of flask_discord.models.User the app uses, rebuilt from the session
+    def __init__(self, data):
+        self.id = int(data["id"])
+        self.name = data["name"]
+        self.discriminator = data.get("discriminator")
+        self.avatar_url = data.get("avatar_url")
+
+    def __str__(self):
+        return self.name
+
+
+def refresh_identity():
+    # One Discord API call; called at login and whenever the cached copy expires
+    user = current_app.discord.fetch_user()
+    session[SESSION_KEY] = {
+        "id": str(user.id),
+        "name": user.name,
+        "discriminator": user.discriminator,
+        "avatar_url": user.avatar_url,
+        "fetched_at": time.time(),
+    }
+    return SessionUser(session[SESSION_KEY])
+
+
+def current_identity():
+    cached = session.get(SESSION_KEY)
+    if not cached or time.time() - cached.get("fetched_at", 0) > IDENTITY_TTL:
+        return refresh_identity()
+    return SessionUser(cached)
+
+
+def clear_identity():
+    session.pop(SESSION_KEY, None)
+
 
 def requires_login(f):
     @wraps(f)
@@ -9,5 +52,6 @@ def requires_login(f):
         discord = current_app.discord
         if not discord.authorized:
             return redirect(url_for("login"))
+        g.user = current_identity()
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
@@ -0,0 +1,97 @@
+# bench/_common.py
+#
+# Setup and seed data shared by the scripts in bench/, check_query_plans.py
+# and tests/. Import it before anything from the app: it puts the repo root on
+# sys.path and, without DATABASE_URL, points the app at a throwaway SQLite
+# file named after the running script, so nothing here writes to a configured
+# database by accident. It also fills in the Discord ids bot.py needs at import.
+#
+# Seed ids are deterministic: user n has id n, discord_id str(n) and rsn
+# "Player n"; queue q has id q and its first member is its host.
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+if not os.getenv("DATABASE_URL"):
+    _name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "bench"
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), f"{_name}.db")
+os.environ.setdefault("DISCORD_LFG_CHANNEL_ID", "1")
+os.environ.setdefault("DISCORD_CATEGORY_ID", "2")
+os.environ.setdefault("DISCORD_ARCHIVE_CHANNEL_ID", "3")
+os.environ.setdefault("DISCORD_REDIRECT_URI", "http://localhost/callback/")
+
+from sqlalchemy import delete, insert, select
+
+from models import Base, Counter, Queue, QueueMember, User
+
+
+def rsn(n):
+    return f"Player {n}"
+
+
+def create_schema(engine):
+    # Tables straight from the models, plus the counter row migrations would add
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if conn.execute(select(Counter).where(Counter.name == "queues")).first() is None:
+            conn.execute(insert(Counter).values(name="queues", value=0))
+
+
+def clear(conn):
+    for model in (QueueMember, Queue, User):
+        conn.execute(delete(model))
+
+
+def insert_users(conn, first, last, now=None):
+    # Linked users first..last inclusive
+    now = now or datetime.utcnow()
+    conn.execute(insert(User), [
+        {"id": n, "discord_id": str(n), "rsn": rsn(n), "linked_at": now} for n in range(first, last + 1)
+    ])
+
+
+def member(q, m, members_per_queue, users=None):
+    # User number of member m of queue q. With ``users`` the queues share users
+    # 1..users round-robin; otherwise queue q has users q*members_per_queue+1..
+    if users:
+        return (q + m) % users + 1
+    return q * members_per_queue + m + 1
+
+
+def insert_queues(conn, queues, members_per_queue, *, users=None, now=None, group_size=8, full=(),
+                  expired=(), expires_at=None, posted=False):
+    """Queues 1..queues with ``members_per_queue`` members each (see member()).
+
+    Queues in ``full`` are sized to their members and those in ``expired``
+    expired a second ago; the rest expire in two hours, or at ``expires_at(q)``
+    when given. ``posted`` gives each queue a Discord message id.
+    """
+    now = now or datetime.utcnow()
+
+    def expiry(q):
+        if q in expired:
+            return now - timedelta(seconds=1)
+        return expires_at(q) if expires_at else now + timedelta(hours=2)
+
+    conn.execute(insert(Queue), [
+        {"id": q, "boss": "ToB", "role": "Casual", "group_size": members_per_queue if q in full else group_size,
+         "created_by": str(member(q, 0, members_per_queue, users)), "expires_at": expiry(q),
+         "created_at": now - timedelta(seconds=q), "version": 1, "discord_message_id": str(q) if posted else None}
+        for q in range(1, queues + 1)
+    ])
+    if members_per_queue:
+        conn.execute(insert(QueueMember), [
+            {"queue_id": q, "discord_id": str(n), "rsn": rsn(n), "joined_at": now}
+            for q in range(1, queues + 1) for n in (member(q, m, members_per_queue, users) for m in range(members_per_queue))
+        ])
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
@@ -0,0 +1,147 @@
+# bench/bench_bot.py
+#
+# Cost of the bot's sync tick as the number of open queues grows. For each
+# scale the queue table is reseeded and a fixed sequence of ticks is run
+# against bench/fake_discord.py:
+#
+#   post    every queue is new: messages posted, VCs made for full teams
+#   steady  nothing changed since the last tick
+#   churn   after joins, leaves and host closes through the button handlers,
+#           and some queues expiring (archived)
+#   minute  a minute passed, so every "expires in" footer is stale
+#
+# Each tick reports its own duration, the time until the outbound queue has
+# drained (the Discord side finished), Discord API calls (429s included) and
+# SQL statements. The handlers of the churn step are reported per interaction.
+#
+#   python bench/bench_bot.py
+#   python bench/bench_bot.py --scales 10,100,1000 --api-latency 50 --rate-limit 0.02
+
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import _common  # first: sys.path and a throwaway database
+from sqlalchemy import update
+
+import bot
+import fake_discord
+from db import count_statements, engine
+from models import Queue
+
+
+def seed(queues, members_per_queue, full_share, joiners):
+    # Every queue has its own members (see _common.member); joiners come after
+    # all of them, so every join lands
+    now = datetime.utcnow()
+    full = set(range(1, queues + 1, max(1, round(1 / full_share)))) if full_share else set()
+    first_joiner = (queues + 1) * members_per_queue + 1
+    with engine.begin() as conn:
+        _common.clear(conn)
+        _common.insert_users(conn, members_per_queue + 1, first_joiner + joiners - 1, now)
+        _common.insert_queues(conn, queues, members_per_queue, now=now, full=full,
+                              expires_at=lambda q: now + timedelta(minutes=90, seconds=30))
+    return full, first_joiner, now
+
+
+class Meter:
+    # Discord calls, 429s and SQL statements within a block, plus wall time
+    def __init__(self, api):
+        self.api = api
+
+    async def __aenter__(self):
+        self._statements = count_statements()
+        self.statements = self._statements.__enter__()
+        self.calls = sum(self.api.calls.values())
+        self.rate_limited = sum(self.api.rate_limited.values())
+        self.began = asyncio.get_running_loop().time()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.elapsed = asyncio.get_running_loop().time() - self.began
+        self._statements.__exit__(*exc)
+        self.calls = sum(self.api.calls.values()) - self.calls
+        self.rate_limited = sum(self.api.rate_limited.values()) - self.rate_limited
+
+
+async def tick(api, scale, name, rows):
+    async with Meter(api) as m:
+        await bot.sync_tick()
+        returned = asyncio.get_running_loop().time() - m.began
+        await bot.outbound.drain()
+    rows.append((scale, name, returned * 1000, m.elapsed * 1000, m.calls, m.rate_limited, m.statements["count"]))
+
+
+async def churn(api, args, scale, full, first_joiner, rows):
+    # Disjoint sets of roomy queues for each kind of change
+    rng = random.Random(scale)
+    roomy = [q for q in range(1, scale + 1) if q not in full]
+    rng.shuffle(roomy)
+    n = max(1, int(scale * args.churn))
+    cuts = [0, n, n + n // 2, n + n // 2 + n // 4, n + n // 2 + n // 2]
+    joins, leaves, closes, expires = (roomy[lo:hi] for lo, hi in zip(cuts, cuts[1:]))
+
+    interactions = (
+        [(bot.handle_join, first_joiner + i, q) for i, q in enumerate(joins)]
+        + [(bot.handle_leave, _common.member(q, 1, args.members_per_queue), q) for q in leaves]
+        + [(bot.handle_close, _common.member(q, 0, args.members_per_queue), q) for q in closes]
+    )
+    async with Meter(api) as m:
+        for handler, user_id, queue_id in interactions:
+            await handler(fake_discord.FakeInteraction(user_id), queue_id)
+        await bot.outbound.drain()
+    count = len(interactions)
+    rows.append((scale, f"handlers/{count}", m.elapsed * 1000 / count, None, m.calls / count,
+                 m.rate_limited / count, m.statements["count"] / count))
+
+    with engine.begin() as conn:
+        conn.execute(update(Queue).where(Queue.id.in_(expires)).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+
+
+async def run(args):
+    api = fake_discord.install(
+        bot, latency=args.api_latency / 1000, rate_limit=args.rate_limit, retry_after=args.retry_after / 1000
+    )
+    _common.create_schema(engine)
+    rows = []
+    for scale in args.scales:
+        full, first_joiner, seeded_at = seed(scale, args.members_per_queue, args.full_share, scale)
+        bot.queue_fingerprints.clear()
+        bot.lost_messages.clear()
+
+        await tick(api, scale, "post", rows)
+        await tick(api, scale, "steady", rows)
+        await churn(api, args, scale, full, first_joiner, rows)
+        await tick(api, scale, "churn", rows)
+        with engine.begin() as conn:
+            # Same as waiting a minute; the expired ones are gone by now
+            conn.execute(update(Queue).values(expires_at=seeded_at + timedelta(minutes=89, seconds=30)))
+        await tick(api, scale, "minute", rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync tick cost as open queues scale")
+    parser.add_argument("--scales", default="10,30,100,300,1000", help="comma-separated open queue counts")
+    parser.add_argument("--members-per-queue", type=int, default=4)
+    parser.add_argument("--full-share", type=float, default=0.05, help="queues that start full (get a VC)")
+    parser.add_argument("--churn", type=float, default=0.1, help="share of queues joined in the churn step")
+    parser.add_argument("--api-latency", type=float, default=20, help="ms per fake Discord API call")
+    parser.add_argument("--rate-limit", type=float, default=0, help="chance a Discord call gets a 429")
+    parser.add_argument("--retry-after", type=float, default=500, help="ms a 429 asks to wait")
+    args = parser.parse_args()
+    args.scales = [int(s) for s in args.scales.split(",")]
+
+    rows = asyncio.run(run(args))
+    print(f"{engine.dialect.name}, API latency {args.api_latency:g}ms, 429 rate {args.rate_limit:g}")
+    print(f"{'queues':>6} {'step':<13} {'tick':>9} {'drained':>10} {'API':>7} {'429s':>6} {'SQL':>6}")
+    for scale, name, returned, drained, calls, limited, statements in rows:
+        drained = f"{drained:>8.0f}ms" if drained is not None else f"{'':>10}"
+        print(f"{scale:>6} {name:<13} {returned:>7.1f}ms {drained} {calls:>7.4g} {limited:>6.3g} {statements:>6.3g}")
+    print("handlers/N rows are per interaction (their Discord work drained before the churn tick)")
+    print(f"outbound: {bot.outbound.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# bench/bench_interactions.py
+#
+# Measures how fast the bot answers button presses while sync ticks run back to
+# back against a large queue table. Interactions (join / leave on random queues)
+# arrive at a fixed rate; latency is the time from arrival to the handler's
+# first response. Event loop lag is sampled alongside.
+#
+#   python bench/bench_interactions.py --queues 500 --query-delay 20
+#   python bench/bench_interactions.py --queues 500 --query-delay 20 --inline
+#
+# --query-delay adds a sleep before every SQL statement to stand in for a
+# remote or busy database. --inline runs the DB work directly on the event
+# loop (the behaviour before bot.run_db) for comparison.
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime
+
+import _common  # first: sys.path and a throwaway database
+from _common import percentile
+from sqlalchemy import event
+
+import bot
+import fake_discord
+from db import engine
+
+
+def seed(queues, members_per_queue, users, joiners):
+    # Roomy queues that outlive the run, already posted to Discord, shared by
+    # users 1..users; the joiners come after them and have linked RSNs too
+    now = datetime.utcnow()
+    _common.create_schema(engine)
+    with engine.begin() as conn:
+        _common.insert_users(conn, 1, users + joiners, now)
+        _common.insert_queues(conn, queues, members_per_queue, users=users, now=now, group_size=100, posted=True)
+
+
+def inline_mode():
+    # The old behaviour: queries run on the event loop thread
+    async def run_db(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    bot.run_db = run_db
+    bot.publish_event = bot.queue_events.publish
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    fake_discord.install(bot, latency=args.api_latency / 1000)
+    latencies, lags, ticks = [], [], []
+    stop = loop.time() + args.duration
+
+    async def ticker():
+        while loop.time() < stop:
+            # Forget what was posted so every tick re-renders each queue
+            bot.queue_fingerprints.clear()
+            began = loop.time()
+            await bot.sync_tick()
+            ticks.append(loop.time() - began)
+            await asyncio.sleep(0)
+
+    async def lag_probe():
+        while loop.time() < stop:
+            began = loop.time()
+            await asyncio.sleep(0.01)
+            lags.append(loop.time() - began - 0.01)
+
+    async def interact(handler, user_id, queue_id, due):
+        interaction = fake_discord.FakeInteraction(user_id)
+        await handler(interaction, queue_id)
+        if interaction.answered_at is not None:
+            latencies.append(interaction.answered_at - due)
+
+    async def traffic():
+        # Open loop: presses arrive on schedule even if the loop is stalled, and
+        # latency counts from the scheduled arrival, so a stall isn't hidden
+        tasks, began = [], loop.time()
+        for n in range(int(args.duration * args.rate)):
+            due = began + n / args.rate
+            if due > loop.time():
+                await asyncio.sleep(due - loop.time())
+            handler = random.choice((bot.handle_join, bot.handle_leave))
+            # Stay clear of the hosts so a leave never disbands a queue mid-run
+            user_id = random.randint(args.users + 1, args.users + args.joiners)
+            tasks.append(asyncio.create_task(interact(handler, user_id, random.randint(1, args.queues), due)))
+        await asyncio.gather(*tasks)
+
+    await asyncio.gather(ticker(), lag_probe(), traffic())
+    await bot.outbound.drain()
+    return latencies, lags, ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interaction latency during sync ticks")
+    parser.add_argument("--queues", type=int, default=500)
+    parser.add_argument("--members-per-queue", type=int, default=5)
+    parser.add_argument("--users", type=int, default=200, help="seeded hosts and members")
+    parser.add_argument("--joiners", type=int, default=200, help="distinct users pressing buttons")
+    parser.add_argument("--rate", type=float, default=50, help="interactions per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--query-delay", type=float, default=0, help="ms slept before each SQL statement")
+    parser.add_argument("--api-latency", type=float, default=0, help="ms per fake Discord API call")
+    parser.add_argument("--inline", action="store_true", help="run DB work on the event loop")
+    args = parser.parse_args()
+
+    seed(args.queues, args.members_per_queue, args.users, args.joiners)
+
+    if args.query_delay:
+        @event.listens_for(engine, "before_cursor_execute")
+        def slow_database(*_):
+            time.sleep(args.query_delay / 1000)
+
+    if args.inline:
+        inline_mode()
+
+    latencies, lags, ticks = asyncio.run(run(args))
+    ms = lambda seconds: f"{seconds * 1000:.1f}ms"
+    print(f"{engine.dialect.name}, {'inline' if args.inline else f'executor ({bot.DB_WORKERS} workers)'}, "
+          f"{args.queues} queues, query delay {args.query_delay:g}ms, {args.rate:g} interactions/s")
+    print(f"  sync ticks:   {len(ticks)}, mean {ms(statistics.mean(ticks) if ticks else 0)}")
+    print(f"  interactions: {len(latencies)}, p50 {ms(percentile(latencies, 50))}, p95 {ms(percentile(latencies, 95))}, "
+          f"p99 {ms(percentile(latencies, 99))}, max {ms(max(latencies, default=0))}")
+    print(f"  loop lag:     p50 {ms(percentile(lags, 50))}, p99 {ms(percentile(lags, 99))}, max {ms(max(lags, default=0))}")
+
+
+if __name__ == "__main__":
+    main()
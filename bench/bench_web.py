@@ -0,0 +1,190 @@
+# bench/bench_web.py
+#
+# Throughput and latency of the Flask routes, offline. Boots app.app in
+# process against a seeded database, with Discord OAuth stubbed (each worker
+# thread is a distinct logged-in user) and index_lite.ws served by
+# bench/fake_hiscores.py. Each route is driven in turn at the given
+# concurrency and reported as req/s, latency percentiles and SQL statements
+# per request.
+#
+#   python bench/bench_web.py --concurrency 8 --requests 500
+#   python bench/bench_web.py --routes stats --hiscore-latency 150 --snapshot-share 0
+#   python bench/bench_web.py --json before.json           # record
+#   python bench/bench_web.py --compare before.json        # exit 1 on regression
+#
+# Point DATABASE_URL at a scratch Postgres database to measure that instead
+# (it is seeded, so never production).
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import _common  # first: sys.path and a throwaway database
+from _common import percentile
+import flask_discord
+from sqlalchemy import insert
+
+import fake_hiscores
+import hiscores
+import migrate
+from auth import SESSION_KEY
+from db import count_statements, engine
+from models import StatSnapshot
+from snapshot_codec import encode_arrays
+
+# Every request is "logged in"; who it is comes from the identity cached in
+# the Flask session, which each worker sets up once (see make_client)
+flask_discord.DiscordOAuth2Session.authorized = property(lambda self: True)
+
+import app as web
+
+ROUTES = {
+    "stats": lambda ctx: ("GET", f"/stats?rsn={random.choice(ctx['rsns'])}", None),
+    "active": lambda ctx: ("GET", "/queue/active", None),
+    "join": lambda ctx: ("GET", f"/queue/join/{random.choice(ctx['queue_ids'])}", None),
+    "create": lambda ctx: ("POST", "/queue/create", {
+        "category": "boss", "activity": "Nex", "role": "Casual", "group_size": "5", "expires_in": "60", "notes": "bench",
+    }),
+}
+
+
+def seed(users, queues, members_per_queue, snapshot_share):
+    migrate.upgrade()
+    now = datetime.utcnow()
+    rsns = [_common.rsn(i) for i in range(1, users + 1)]
+    with engine.begin() as conn:
+        _common.insert_users(conn, 1, users, now)
+        # Fresh snapshots (as the collector would write) for a share of players; the rest hit hiscores
+        with_snapshots = rsns[:int(users * snapshot_share)]
+        if with_snapshots:
+            skills, activities = hiscores.parse_batch(fake_hiscores.lite_body(r).decode() for r in with_snapshots)
+            conn.execute(insert(StatSnapshot), [
+                {"user_id": i, "timestamp": now, "data": encode_arrays(skills[i - 1].T, activities[i - 1].T)}
+                for i in range(1, len(with_snapshots) + 1)
+            ])
+        _common.insert_queues(conn, queues, members_per_queue, users=users, now=now, group_size=100)
+    return {"rsns": rsns, "queue_ids": list(range(1, queues + 1))}
+
+
+_local = threading.local()
+_next_user = iter(range(1, 10**9))
+_next_user_lock = threading.Lock()
+
+
+def make_client(users):
+    # One test client per worker thread, logged in as its own linked user
+    if not hasattr(_local, "client"):
+        with _next_user_lock:
+            n = next(_next_user)
+        client = web.app.test_client()
+        with client.session_transaction() as session:
+            session[SESSION_KEY] = {
+                "id": str((n - 1) % users + 1), "name": f"bench{n}", "discriminator": "0",
+                "avatar_url": "", "fetched_at": time.time() + 10**6,
+            }
+        _local.client = client
+    return _local.client
+
+
+def run_route(name, ctx, args):
+    def one(_):
+        method, path, form = ROUTES[name](ctx)
+        client = make_client(args.users)
+        began = time.perf_counter()
+        response = client.open(path, method=method, data=form)
+        elapsed = time.perf_counter() - began
+        return elapsed, response.status_code
+
+    # Warm up caches and connections so the numbers describe steady state
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, range(min(args.concurrency * 2, args.requests))))
+
+    served_before = ctx["hiscores"].requests
+    began = time.perf_counter()
+    with count_statements() as statements, ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - began
+
+    latencies = [elapsed for elapsed, _ in results]
+    return {
+        "route": name,
+        "requests": args.requests,
+        "errors": sum(1 for _, status in results if status >= 400),
+        "rps": args.requests / wall,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "sql_per_request": statements["count"] / args.requests,
+        "hiscore_fetches": ctx["hiscores"].requests - served_before,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    # Regressions: p95 or SQL statements per request up by more than ``tolerance``
+    with open(baseline_path) as f:
+        baseline = {r["route"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["route"])
+        if not before:
+            continue
+        for key in ("p95_ms", "sql_per_request"):
+            if result[key] > before[key] * (1 + tolerance) and result[key] - before[key] > 0.5:
+                regressions.append(f"{result['route']} {key}: {before[key]:.1f} -> {result[key]:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Flask routes with local stand-ins")
+    parser.add_argument("--routes", default=",".join(ROUTES), help=f"comma-separated: {', '.join(ROUTES)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400, help="per route")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--queues", type=int, default=50)
+    parser.add_argument("--members-per-queue", type=int, default=4)
+    parser.add_argument("--snapshot-share", type=float, default=0.5, help="players with a fresh snapshot")
+    parser.add_argument("--hiscore-latency", type=float, default=100, help="ms per fake index_lite.ws request")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline JSON from --json; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    server = fake_hiscores.start(latency=args.hiscore_latency / 1000)
+    hiscores.client.url = server.url
+    ctx = seed(args.users, args.queues, args.members_per_queue, args.snapshot_share)
+    ctx["hiscores"] = server
+
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    print(f"{engine.dialect.name}, concurrency {args.concurrency}, {args.requests} requests/route, "
+          f"{args.queues} queues, hiscore latency {args.hiscore_latency:g}ms")
+    print(f"{'route':<8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL/req':>8} {'errors':>7} {'hiscore':>8}")
+    results = []
+    for name in routes:
+        r = run_route(name, ctx, args)
+        results.append(r)
+        print(f"{name:<8} {r['rps']:>8.0f} {r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms "
+              f"{r['sql_per_request']:>8.1f} {r['errors']:>7} {r['hiscore_fetches']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "dialect": engine.dialect.name, "results": results}, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
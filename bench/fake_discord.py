@@ -0,0 +1,174 @@
+# bench/fake_discord.py
+#
+# Just enough of the Discord API surface for bot.py to run without a gateway
+# connection: channels, messages, a guild and interactions. Every API call is
+# counted in ``calls`` and can be given a fixed latency. A share of calls can
+# be answered with a 429 (an HTTPException carrying retry_after, as
+# discord_ops expects) instead of running.
+#
+# Channels keep what was done to them: ``sent`` and ``deleted`` message ids,
+# ``edits`` per message id, and the guild its ``voice_channels``.
+#
+#   import fake_discord   # from a script in bench/
+#   api = fake_discord.install(bot, latency=0.05, rate_limit=0.02)
+#   await bot.sync_tick()
+#   print(api.calls, api.rate_limited)
+
+import asyncio
+import itertools
+import random
+from collections import Counter
+
+import discord
+
+
+class FakeRateLimited(discord.HTTPException):
+    # What a 429 looks like once it reaches bot code
+    def __init__(self, retry_after):
+        self.response = None
+        self.status = 429
+        self.code = 0
+        self.text = "You are being rate limited."
+        self.retry_after = retry_after
+        Exception.__init__(self, f"429 Too Many Requests (retry after {retry_after}s)")
+
+
+class FakeAPI:
+    def __init__(self, latency=0.0, rate_limit=0.0, retry_after=0.5, seed=0):
+        self.latency = latency
+        self.rate_limit = rate_limit  # chance that a call gets a 429
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self._random = random.Random(seed)
+        self._ids = itertools.count(10_000_000)
+
+    async def call(self, name):
+        # A rejected call still costs a round trip and counts against the limit
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit and self._random.random() < self.rate_limit:
+            self.rate_limited[name] += 1
+            raise FakeRateLimited(self.retry_after)
+
+    def next_id(self):
+        return next(self._ids)
+
+
+class FakeMessage:
+    def __init__(self, api, channel, message_id):
+        self.api = api
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        await self.api.call("edit")
+        self.channel.edits[self.id] += 1
+        return self
+
+    async def delete(self):
+        await self.api.call("delete")
+        self.channel.deleted.append(self.id)
+
+
+class FakeCategory:
+    def __init__(self, category_id):
+        self.id = category_id
+
+
+class FakeVoiceChannel:
+    def __init__(self, channel_id, name):
+        self.id = channel_id
+        self.name = name
+        self.mention = f"<#{channel_id}>"
+        self.jump_url = f"https://discord.com/channels/0/{channel_id}"
+        self.members = []
+
+    async def delete(self):
+        pass
+
+
+class FakeGuild:
+    def __init__(self, api, guild_id, category_id):
+        self.api = api
+        self.id = guild_id
+        self.categories = [FakeCategory(category_id)]
+        self.default_role = object()
+        self.me = object()
+        self.voice_channels = []
+
+    async def create_voice_channel(self, name, **kwargs):
+        await self.api.call("create_voice_channel")
+        channel = FakeVoiceChannel(self.api.next_id(), name)
+        self.voice_channels.append(channel)
+        return channel
+
+
+class FakeChannel:
+    def __init__(self, api, channel_id, guild):
+        self.api = api
+        self.id = channel_id
+        self.guild = guild
+        self.sent = []
+        self.edits = Counter()
+        self.deleted = []
+
+    async def send(self, *args, **kwargs):
+        await self.api.call("send")
+        message = FakeMessage(self.api, self, self.api.next_id())
+        self.sent.append(message.id)
+        return message
+
+    async def fetch_message(self, message_id):
+        await self.api.call("fetch_message")
+        return FakeMessage(self.api, self, message_id)
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(self.api, self, message_id)
+
+    async def delete_messages(self, messages):
+        await self.api.call("delete_messages")
+        self.deleted.extend(m.id for m in messages)
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send_message(self, content=None, **kwargs):
+        self.interaction.responded(content)
+
+    async def defer(self, **kwargs):
+        self.interaction.responded(None)
+
+
+class FakeInteraction:
+    # Records when (loop time) the handler first answered
+    def __init__(self, user_id, on_response=None):
+        self.user = type("FakeUser", (), {"id": user_id, "mention": f"<@{user_id}>"})()
+        self.response = FakeResponse(self)
+        self.answered_at = None
+        self.content = None
+        self.on_response = on_response
+
+    def responded(self, content):
+        if self.answered_at is None:
+            self.answered_at = asyncio.get_running_loop().time()
+            self.content = content
+            if self.on_response:
+                self.on_response(self)
+
+
+def install(bot_module, latency=0.0, guild_id=1, rate_limit=0.0, retry_after=0.5):
+    # Points bot.get_channel at fake LFG and archive channels; returns the FakeAPI
+    # (its ``channels`` are keyed by id, so tests can look at what was sent where)
+    api = FakeAPI(latency, rate_limit, retry_after)
+    guild = FakeGuild(api, guild_id, bot_module.CATEGORY_ID)
+    api.guild = guild
+    api.channels = {bot_module.LFG_CHANNEL_ID: FakeChannel(api, bot_module.LFG_CHANNEL_ID, guild)}
+    archive_id = int(bot_module.os.getenv("DISCORD_ARCHIVE_CHANNEL_ID", 0))
+    if archive_id:
+        api.channels[archive_id] = FakeChannel(api, archive_id, guild)
+    bot_module.bot.get_channel = api.channels.get
+    return api
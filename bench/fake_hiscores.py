@@ -0,0 +1,81 @@
+# bench/fake_hiscores.py
+#
+# A local stand-in for the OSRS index_lite.ws endpoint. Serves well-formed
+# responses for any player (except names starting with "missing", which get
+# a 404) after a configurable delay, and counts requests.
+#
+#   import fake_hiscores   # from a script in bench/
+#   server = fake_hiscores.start(latency=0.15)
+#   hiscores.client.url = server.url
+#
+# Run directly to serve on a fixed port: python bench/fake_hiscores.py --port 8765
+
+import argparse
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import _common  # puts the repo root on sys.path
+from hiscore_layout import ACTIVITIES, SKILLS
+
+
+def lite_body(player):
+    # Deterministic per player, so repeated runs compare like with like
+    seed = zlib.crc32(player.lower().encode())
+    lines = []
+    for i, _ in enumerate(SKILLS):
+        xp = (seed >> (i % 16)) % 13_000_000
+        lines.append(f"{1 + seed % 500_000},{1 + xp % 99},{xp}")
+    for i, _ in enumerate(ACTIVITIES):
+        score = (seed >> (i % 16)) % 3000
+        lines.append(f"{1 + score},{score}" if score % 3 else "-1,-1")
+    return "\n".join(lines).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        player = parse_qs(urlparse(self.path).query).get("player", [""])[0]
+        if not player or player.lower().startswith("missing"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = lite_body(player)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeHiscores(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.requests = 0
+        self.url = f"http://127.0.0.1:{self.server_port}/m=hiscore_oldschool/index_lite.ws"
+
+
+def start(port=0, latency=0.0):
+    server = FakeHiscores(port, latency)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-hiscores").start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake index_lite.ws responses")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="ms per request")
+    args = parser.parse_args()
+    server = FakeHiscores(args.port, args.latency / 1000)
+    print(f"Serving {server.url}")
+    server.serve_forever()
@@ -0,0 +1,114 @@
+# bench/stress_join.py
+#
+# Hammers queue_ops.join_queue from many threads against one queue and checks
+# that it never overfills or duplicates members, and that members pressing
+# Join again are told DUPLICATE rather than FULL, also once the queue is full.
+#
+#   DATABASE_URL=postgresql://... python bench/stress_join.py --joiners 200 --size 5
+#
+# It clears the queue tables first, so only point DATABASE_URL at a scratch
+# database. --legacy runs the old read-check-insert join for comparison.
+
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import _common  # first: sys.path and a throwaway database
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from db import SessionLocal, count_statements, engine
+from models import Queue, QueueMember
+from queue_ops import JoinResult, join_queue
+
+
+def legacy_join(db, queue_id, discord_id, rsn):
+    # The pre-queue_ops logic: read, check in Python, then insert
+    queue = db.query(Queue).filter_by(id=queue_id).first()
+    if any(m.discord_id == discord_id for m in queue.members):
+        return JoinResult.DUPLICATE
+    if len(queue.members) >= queue.group_size:
+        return JoinResult.FULL
+    db.add(QueueMember(queue_id=queue_id, discord_id=discord_id, rsn=rsn))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return JoinResult.DUPLICATE
+    return JoinResult.JOINED
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--joiners", type=int, default=200, help="join attempts")
+    parser.add_argument("--size", type=int, default=5, help="queue group size")
+    parser.add_argument("--threads", type=int, default=12)
+    parser.add_argument("--duplicates", type=float, default=0.25, help="share of attempts reusing an id")
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    _common.create_schema(engine)
+    with engine.begin() as conn:
+        _common.clear(conn)
+        _common.insert_queues(conn, 1, 0, group_size=args.size)
+    queue_id = 1
+
+    # The first group_size ids fill the queue; repeats of them are spread over
+    # the rest, so most arrive once it is already full
+    unique = max(args.size + 1, int(args.joiners * (1 - args.duplicates)))
+    later = [f"stress-{i}" for i in range(args.size, unique)]
+    later += [f"stress-{i % args.size}" for i in range(args.joiners - unique)]
+    random.Random(0).shuffle(later)
+    ids = [f"stress-{i}" for i in range(args.size)] + later
+    start_gate = threading.Barrier(min(args.threads, args.joiners))
+
+    def attempt(discord_id):
+        try:
+            start_gate.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        session = SessionLocal()
+        try:
+            if args.legacy:
+                return legacy_join(session, queue_id, discord_id, discord_id)
+            return join_queue(session, queue_id, discord_id, discord_id).result
+        except Exception as e:
+            return type(e).__name__
+        finally:
+            session.close()
+
+    began = time.perf_counter()
+    with count_statements() as statements, ThreadPoolExecutor(args.threads) as pool:
+        outcomes = list(pool.map(attempt, ids))
+    results = Counter(outcomes)
+    elapsed = time.perf_counter() - began
+
+    db = SessionLocal()
+    members = db.query(func.count(QueueMember.id)).filter_by(queue_id=queue_id).scalar()
+    distinct = db.query(func.count(func.distinct(QueueMember.discord_id))).filter_by(queue_id=queue_id).scalar()
+    member_ids = {row[0] for row in db.query(QueueMember.discord_id).filter_by(queue_id=queue_id)}
+    db.close()
+
+    print(f"{engine.dialect.name}, {'legacy' if args.legacy else 'queue_ops'} join, "
+          f"{args.joiners} attempts on {args.threads} threads, group size {args.size}")
+    for result, count in results.most_common():
+        print(f"  {getattr(result, 'value', result):>12}: {count}")
+    print(f"  members: {members} ({distinct} distinct), {elapsed:.2f}s, "
+          f"{args.joiners / elapsed:.0f} joins/s, {statements['count'] / args.joiners:.1f} statements/attempt")
+
+    # Nobody leaves, so a member's attempt can never have found the queue full
+    misreported = sum(1 for i, r in zip(ids, outcomes) if i in member_ids and r is JoinResult.FULL)
+    if misreported:
+        print(f"  {misreported} re-joins by members were reported as full")
+
+    ok = members <= args.size and members == distinct and results[JoinResult.JOINED] == members and not misreported
+    print("OK" if ok else "FAILED: queue overfilled, duplicated or re-joins misreported")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,18 @@ from discord import app_commands
 from discord.ui import Button, View, Select, Modal, TextInput
 import os
 from dotenv import load_dotenv
-from db import SessionLocal
+from db import session_scope, pool_stats
 from models import Queue, QueueMember, User
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from leaderboards import clan_leaderboards, METRICS, GAIN_METRICS
+import queue_events
+from expiry import ExpiryScheduler
+from queue_ops import JoinResult, bump_hosted_queues, bump_queues_version, join_queue, remove_member
+from discord_ops import OutboundQueue, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 # Load environment variables
@@ -15,6 +24,11 @@ TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 # Remove any non-alphanumeric characters if user pasted strangely, but keep dots/underscores
 LFG_CHANNEL_ID = int(os.getenv("DISCORD_LFG_CHANNEL_ID"))
 CATEGORY_ID = int(os.getenv("DISCORD_CATEGORY_ID"))
+# Queue changes are pushed through queue_events and expiry is scheduled in-process;
+# this poll only reconciles missed events
+RECONCILE_INTERVAL = int(os.getenv("QUEUE_RECONCILE_INTERVAL", 300))
+# Threads for blocking DB work; keep at or below DB_POOL_SIZE so they never queue for a connection
+DB_WORKERS = int(os.getenv("BOT_DB_WORKERS", 4))
 
 # Intents
 intents = discord.Intents.default()
@@ -24,22 +38,114 @@ intents.voice_states = True # Required for on_voice_state_update
 
 bot = commands.Bot(command_prefix="!", intents=intents)
 
-# ... (Previous code) ...
+# --- DB WORK ---
+# SQLAlchemy sessions are blocking, so every query runs on this bounded pool and the
+# event loop (gateway heartbeat, interactions, voice events) never waits on the database.
+# Each function opens and closes its own session; anything it returns is detached.
 
-    try:
-        q_update = db.query(Queue).filter_by(id=q.id).first()
-        q_update.discord_channel_id = str(vc.id)
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="bot-db")
+
+async def run_db(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(db_executor, partial(func, *args, **kwargs))
+
+def publish_event(event, queue_id):
+    # pg_notify is a DB round trip too; fire-and-forget on the pool
+    db_executor.submit(queue_events.publish, event, queue_id)
+
+def save_rsn(discord_id, rsn):
+    # Returns True if an existing link was updated
+    with session_scope() as db:
+        user = db.query(User).filter_by(discord_id=discord_id).first()
+        if user:
+            user.rsn = rsn
+            bump_hosted_queues(db, discord_id)
+        else:
+            db.add(User(discord_id=discord_id, rsn=rsn))
         db.commit()
-        
-        # Build Mentions
-        mentions = " ".join([f"<@{m.discord_id}>" for m in q.members])
-        
-        # Notify
-        await text_channel.send(
-            f"✅ **Queue Full!** {mentions}\nVoice Channel Created: {vc.mention}",
-            view=JoinVCView(vc.jump_url)
-            # Removed delete_after so they see the ping
+        return user is not None
+
+def load_leaderboard(discord_id, metric, period):
+    with session_scope() as db:
+        user = db.query(User).filter_by(discord_id=discord_id).first()
+        rows, my_rank, total = clan_leaderboards.query(db, metric, period, k=10, user_id=user.id if user else None)
+        names = dict(db.query(User.id, User.rsn).filter(User.id.in_([r[1] for r in rows])).all())
+        return rows, my_rank, total, names
+
+def linked_rsn(discord_id):
+    with session_scope() as db:
+        return db.query(User.rsn).filter_by(discord_id=discord_id).scalar()
+
+def create_queue(discord_id, rsn, activity, role, group_size, description, expires_at):
+    with session_scope() as db:
+        queue = Queue(
+            boss=activity,
+            role=role,
+            group_size=group_size,
+            created_by=discord_id,
+            description=description,
+            expires_at=expires_at
         )
+        db.add(queue)
+        db.flush()
+        db.add(QueueMember(queue_id=queue.id, discord_id=discord_id, rsn=rsn))
+        bump_queues_version(db)
+        db.commit()
+        return queue.id
+
+def queue_id_for_message(message_id):
+    with session_scope() as db:
+        return db.query(Queue.id).filter_by(discord_message_id=str(message_id)).scalar() or 0
+
+def join_as(discord_id, queue_id):
+    # JoinOutcome, or None if the user hasn't linked an RSN
+    with session_scope() as db:
+        rsn = db.query(User.rsn).filter_by(discord_id=discord_id).scalar()
+        if rsn is None:
+            return None
+        return join_queue(db, queue_id, discord_id, rsn)
+
+def take_queue(db, queue):
+    # Delete ``queue`` but keep its loaded state (members included) for the archive embed
+    db.expunge(queue)
+    delete_queues(db, [queue.id])
+    db.commit()
+    return queue
+
+def leave_as(discord_id, queue_id):
+    # ("not_found" | "disbanded" | "left" | "not_member", archived queue or None)
+    with session_scope() as db:
+        queue = db.query(Queue).options(joinedload(Queue.members)).filter_by(id=queue_id).first()
+        if not queue:
+            return "not_found", None
+        # Ensure we compare strings properly
+        if str(queue.created_by).strip() == discord_id:
+            return "disbanded", take_queue(db, queue)
+        return ("left" if remove_member(db, queue_id, discord_id) else "not_member"), None
+
+def close_as(discord_id, queue_id):
+    # ("not_found" | "not_host" | "closed", archived queue or None)
+    with session_scope() as db:
+        queue = db.query(Queue).options(joinedload(Queue.members)).filter_by(id=queue_id).first()
+        if not queue:
+            return "not_found", None
+        if str(queue.created_by).strip() != discord_id:
+            return "not_host", None
+        return "closed", take_queue(db, queue)
+
+def load_queues():
+    with session_scope() as db:
+        # One round trip: every queue with its members eagerly joined
+        queues = db.query(Queue).options(joinedload(Queue.members)).order_by(Queue.id).all()
+        db.expunge_all()
+        return queues
+
+def save_tick(expired_ids, updates):
+    # One transaction: drop archived queues, store new Discord ids
+    with session_scope() as db:
+        delete_queues(db, expired_ids)
+        if updates:
+            db.execute(update(Queue), updates)
+        db.commit()
 
 # --- COMMANDS ---
 
@@ -63,25 +169,46 @@ async def create_boss(interaction: discord.Interaction):
 @bot.tree.command(name="link", description="Link your OSRS Username (RSN)")
 @app_commands.describe(rsn="Your Old School Runescape Name")
 async def link_rsn(interaction: discord.Interaction, rsn: str):
-    discord_id = str(interaction.user.id)
-    db = SessionLocal()
     try:
-        # Check if exists
-        user = db.query(User).filter_by(discord_id=discord_id).first()
-        if user:
-            user.rsn = rsn
-            msg = f"✅ Updated your RSN to: **{rsn}**"
-        else:
-            user = User(discord_id=discord_id, rsn=rsn)
-            db.add(user)
-            msg = f"✅ Linked RSN: **{rsn}**"
-        
-        db.commit()
+        updated = await run_db(save_rsn, str(interaction.user.id), rsn)
+        msg = f"✅ Updated your RSN to: **{rsn}**" if updated else f"✅ Linked RSN: **{rsn}**"
         await interaction.response.send_message(msg, ephemeral=True)
     except Exception as e:
         await interaction.response.send_message(f"❌ Error linking RSN: {e}", ephemeral=True)
-    finally:
-        db.close()
+
+@bot.tree.command(name="leaderboard", description="Show the clan leaderboard")
+@app_commands.describe(metric="Skill, Overall or Combat", period="Current stats or XP gained over a period")
+@app_commands.choices(period=[
+    app_commands.Choice(name="Current", value="all"),
+    app_commands.Choice(name="Gained today", value="day"),
+    app_commands.Choice(name="Gained this week", value="week"),
+    app_commands.Choice(name="Gained this month", value="month"),
+])
+async def leaderboard(interaction: discord.Interaction, metric: str = "Overall", period: str = "all"):
+    if metric not in METRICS:
+        await interaction.response.send_message(f"❌ Unknown metric **{metric}**.", ephemeral=True)
+        return
+    if period != "all" and metric not in GAIN_METRICS:
+        await interaction.response.send_message("❌ Gains are only tracked for skills.", ephemeral=True)
+        return
+
+    rows, my_rank, total, names = await run_db(load_leaderboard, str(interaction.user.id), metric, period)
+
+    title = f"🏆 {metric}" + ("" if period == "all" else f" - XP gained ({period})")
+    embed = discord.Embed(title=title, color=discord.Color.gold())
+    lines = []
+    for rank, user_id, score in rows:
+        value = f"{score[0]} ({score[1]:,} xp)" if isinstance(score, tuple) else f"{score:,}"
+        lines.append(f"**#{rank}** {names.get(user_id, 'Unknown')} - {value}")
+    embed.description = "\n".join(lines) if lines else "No ranked players yet."
+    if my_rank:
+        embed.set_footer(text=f"Your rank: #{my_rank} of {total}")
+
+    await interaction.response.send_message(embed=embed)
+
+@leaderboard.autocomplete("metric")
+async def leaderboard_metric_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=m, value=m) for m in METRICS if current.lower() in m.lower()][:25]
 
 @bot.command()
 async def sync(ctx):
@@ -93,6 +220,23 @@ async def sync(ctx):
     except Exception as e:
         await ctx.send(f"❌ Sync failed: {e}")
 
+@bot.command()
+async def syncstats(ctx):
+    s, o = sync_stats, outbound.stats
+    await ctx.send(
+        f"🔄 Ticks: {s['ticks']} | Edits: {s['edits']} | Skipped (unchanged): {s['skipped']} | "
+        f"API calls saved: {s['api_calls_saved']}\n"
+        f"📤 Outbound: {o['executed']} sent | {o['coalesced']} coalesced | "
+        f"{o['rate_limited']} rate limited | {o['failed']} failed | {outbound.pending()} pending"
+    )
+
+@bot.command()
+async def poolstats(ctx):
+    await ctx.send(
+        "🗄️ DB pool: " + " | ".join(f"{k}: {v}" for k, v in pool_stats().items())
+        + f" | db workers: {DB_WORKERS} | db jobs queued: {db_executor._work_queue.qsize()}"
+    )
+
 @bot.command()
 async def clearglobals(ctx):
     try:
@@ -190,11 +334,10 @@ class QueueConfigModal(Modal):
 
     async def on_submit(self, interaction: discord.Interaction):
         discord_id = str(interaction.user.id)
-        db = SessionLocal()
         try:
             # 1. Check RSN Link
-            user = db.query(User).filter_by(discord_id=discord_id).first()
-            if not user:
+            rsn = await run_db(linked_rsn, discord_id)
+            if not rsn:
                 await interaction.response.send_message(
                     "❌ You must link your RSN first!\nUse `/link [rsn]` here in Discord, or visit https://bosscape.com/link", 
                     ephemeral=True
@@ -223,188 +366,197 @@ class QueueConfigModal(Modal):
 
             # 3. Create Queue
             expires_at = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=exp_mins)
-            
-            queue = Queue(
-                boss=self.activity,
-                role=self.role,
-                group_size=g_size,
-                created_by=discord_id,
-                description=self.notes.value,
-                expires_at=expires_at
+            queue_id = await run_db(
+                create_queue, discord_id, rsn, self.activity, self.role, g_size, self.notes.value, expires_at
             )
-            db.add(queue)
-            db.commit()
-
-            member = QueueMember(queue_id=queue.id, discord_id=discord_id, rsn=user.rsn)
-            db.add(member)
-            db.commit()
 
             await interaction.response.send_message(f"✅ Queue created for **{self.activity}** ({self.role})!", ephemeral=True)
+            await update_queue_message(queue_id, "create")
 
         except Exception as e:
             await interaction.response.send_message(f"Error: {e}", ephemeral=True)
-        finally:
-            db.close()
 
 # --- VIEW FOR BUTTONS ---
+# Queue buttons carry their queue id in the custom_id ("queue:<action>:<id>") and are
+# dispatched by on_interaction below, so they keep working across restarts without
+# any View registered in memory.
+QUEUE_CUSTOM_ID_PREFIX = "queue:"
+# custom_ids used before the queue id was encoded; resolved through the message id
+LEGACY_CUSTOM_IDS = {"join_queue": "join", "leave_queue": "leave", "close_queue": "close"}
+
 class QueueView(View):
+    # Components only: built when a queue message is first posted, never listened on
     def __init__(self, queue_id):
         super().__init__(timeout=None)
-        self.queue_id = queue_id
-
-    @discord.ui.button(label="Join", style=discord.ButtonStyle.green, custom_id="join_queue")
-    async def join_button(self, interaction: discord.Interaction, button: Button):
-        await handle_join(interaction, self.queue_id)
-
-    @discord.ui.button(label="Leave", style=discord.ButtonStyle.red, custom_id="leave_queue")
-    async def leave_button(self, interaction: discord.Interaction, button: Button):
-        await handle_leave(interaction, self.queue_id)
-
-    @discord.ui.button(label="Close (Host)", style=discord.ButtonStyle.gray, custom_id="close_queue")
-    async def close_button(self, interaction: discord.Interaction, button: Button):
-        await handle_close(interaction, self.queue_id)
+        self.add_item(Button(label="Join", style=discord.ButtonStyle.green, custom_id=f"queue:join:{queue_id}"))
+        self.add_item(Button(label="Leave", style=discord.ButtonStyle.red, custom_id=f"queue:leave:{queue_id}"))
+        self.add_item(Button(label="Close (Host)", style=discord.ButtonStyle.gray, custom_id=f"queue:close:{queue_id}"))
+        # A finished view is not stored by discord.py when the message is sent
+        self.stop()
 
 class JoinVCView(View):
     def __init__(self, url):
         super().__init__(timeout=None)
         self.add_item(Button(label="🔊 Join Voice Channel", url=url))
+        # Link button only; nothing to dispatch
+        self.stop()
+
+@bot.event
+async def on_interaction(interaction: discord.Interaction):
+    if interaction.type != discord.InteractionType.component:
+        return
+    custom_id = (interaction.data or {}).get("custom_id", "")
+
+    if custom_id.startswith(QUEUE_CUSTOM_ID_PREFIX):
+        try:
+            _, action, queue_id = custom_id.split(":", 2)
+            queue_id = int(queue_id)
+        except ValueError:
+            return
+    elif custom_id in LEGACY_CUSTOM_IDS and interaction.message:
+        action = LEGACY_CUSTOM_IDS[custom_id]
+        queue_id = await run_db(queue_id_for_message, interaction.message.id)
+    else:
+        return
+
+    handler = QUEUE_ACTIONS.get(action)
+    if handler:
+        await handler(interaction, queue_id)
 
 # --- HELPER: ARCHIVE QUEUE ---
-async def archive_queue(q: Queue, reason: str = "Finished"):
+ARCHIVE_EMBEDS_PER_MESSAGE = 10  # Discord's limit per message
+ARCHIVE_CHARS_PER_MESSAGE = 6000  # Discord's limit on the text of all embeds in a message
+BULK_DELETE_LIMIT = 100  # Discord's limit per bulk delete
+
+def archive_discord(queues, reason: str = "Finished"):
+    # Queues the Discord side of archiving; the outbound workers run it concurrently per channel
+    if not queues:
+        return
+    for q in queues:
+        queue_fingerprints.pop(q.id, None)
+        lost_messages.discard(q.id)
+        open_queues.pop(q.id, None)
+        if expiry_scheduler.cancel(q.id):
+            schedule_changed.set()
+        publish_event("expire" if reason == "Finished" else "close", q.id)
     channel = bot.get_channel(LFG_CHANNEL_ID)
     archive_channel = bot.get_channel(int(os.getenv("DISCORD_ARCHIVE_CHANNEL_ID", 0)))
     
-    # Delete from active
-    if q.discord_message_id and channel:
-        try:
-            msg = await channel.fetch_message(int(q.discord_message_id))
-            await msg.delete()
-        except:
-            pass
+    # Delete from active. Queue messages live at most 180 mins, well inside the 14-day bulk delete window
+    message_ids = [int(q.discord_message_id) for q in queues if q.discord_message_id]
+    if message_ids and channel:
+        bucket = ("channel", channel.id)
+        for message_id in message_ids:
+            # Pending edits of these messages are pointless now
+            outbound.discard(bucket, ("message", message_id))
+        for i in range(0, len(message_ids), BULK_DELETE_LIMIT):
+            outbound.submit(bucket, partial(delete_messages, channel, message_ids[i:i + BULK_DELETE_LIMIT]), PRIORITY_NORMAL)
 
     # Post to Archive
     if archive_channel:
-        try:
+        # Calculate end time properly
+        now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+        embeds = []
+        for q in queues:
             embed = build_embed(q)
             embed.title = f"[{reason}] {embed.title}"
             embed.color = discord.Color.dark_grey()
-            # Calculate end time properly
-            now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
             embed.set_footer(text=f"Ended at {now_naive.strftime('%H:%M UTC')} | ID: {q.id}")
-            await archive_channel.send(embed=embed)
-        except Exception as e:
-            print(f"Archive Error: {e}")
+            embeds.append(embed)
+        for batch in batch_embeds(embeds):
+            outbound.submit(("channel", archive_channel.id), partial(archive_channel.send, embeds=batch), PRIORITY_NORMAL)
+
+def batch_embeds(embeds):
+    # Split into messages within both the embed count and total character limits
+    batch, chars = [], 0
+    for embed in embeds:
+        size = len(embed)
+        if batch and (len(batch) == ARCHIVE_EMBEDS_PER_MESSAGE or chars + size > ARCHIVE_CHARS_PER_MESSAGE):
+            yield batch
+            batch, chars = [], 0
+        batch.append(embed)
+        chars += size
+    if batch:
+        yield batch
+
+async def delete_message(channel, message_id):
+    try:
+        await channel.get_partial_message(message_id).delete()
+    except discord.NotFound:
+        pass
 
-    # Delete from DB
-    db = SessionLocal()
+async def delete_messages(channel, message_ids):
     try:
-        # Re-fetch to ensure attached
-        to_del = db.query(Queue).filter_by(id=q.id).first()
-        if to_del:
-            db.delete(to_del)
-            db.commit()
-    finally:
-        db.close()
+        await channel.delete_messages([discord.Object(id=message_id) for message_id in message_ids])
+    except discord.HTTPException as e:
+        if e.status == 429:
+            raise
+        # e.g. one of them was already deleted by hand: fall back to one at a time
+        for message_id in message_ids:
+            await delete_message(channel, message_id)
+
+def delete_queues(db, queue_ids):
+    # Bulk deletes skip ORM cascades, so remove members explicitly first
+    if not queue_ids:
+        return
+    db.query(QueueMember).filter(QueueMember.queue_id.in_(queue_ids)).delete(synchronize_session=False)
+    db.query(Queue).filter(Queue.id.in_(queue_ids)).delete(synchronize_session=False)
+    bump_queues_version(db)
 
 # --- EVENT HANDLERS ---
 
 async def handle_join(interaction: discord.Interaction, queue_id: int):
     discord_id = str(interaction.user.id)
-    db = SessionLocal()
     try:
-        # Check RSN link
-        user = db.query(User).filter_by(discord_id=discord_id).first()
-        if not user:
+        outcome = await run_db(join_as, discord_id, queue_id)
+        if outcome is None:
             await interaction.response.send_message(
                 "❌ You must link your RSN first!\nUse `/link [rsn]` here in Discord, or visit https://bosscape.com/link", 
                 ephemeral=True
             )
-            return
-
-        queue = db.query(Queue).filter_by(id=queue_id).first()
-        if not queue:
-            await interaction.response.send_message("❌ Queue not found (it may have expired).", ephemeral=True)
-            return
-
-        # Check existing
-        if any(m.discord_id == discord_id for m in queue.members):
+        elif outcome.result is JoinResult.JOINED:
+            await interaction.response.send_message(f"✅ Joined **{outcome.boss}** queue!", ephemeral=True)
+            # Trigger update immediately
+            await update_queue_message(queue_id, "join")
+        elif outcome.result is JoinResult.DUPLICATE:
             await interaction.response.send_message("⚠️ You are already in this queue.", ephemeral=True)
-            return
-
-        # Check full
-        if len(queue.members) >= queue.group_size:
+        elif outcome.result is JoinResult.FULL:
             await interaction.response.send_message("❌ Queue is full.", ephemeral=True)
-            return
-
-        # Add member
-        new_member = QueueMember(queue_id=queue.id, discord_id=discord_id, rsn=user.rsn)
-        db.add(new_member)
-        db.commit()
-        await interaction.response.send_message(f"✅ Joined **{queue.boss}** queue!", ephemeral=True)
-        
-        # Trigger update immediately
-        await update_queue_message(queue.id)
+        else:
+            await interaction.response.send_message("❌ Queue not found (it may have expired).", ephemeral=True)
 
     except Exception as e:
         await interaction.response.send_message(f"Error: {e}", ephemeral=True)
-    finally:
-        db.close()
 
 async def handle_leave(interaction: discord.Interaction, queue_id: int):
-    discord_id = str(interaction.user.id)
-    db = SessionLocal()
-    try:
-        queue = db.query(Queue).filter_by(id=queue_id).first()
-        if not queue:
-            await interaction.response.send_message("⚠️ Queue not found.", ephemeral=True)
-            return
-
-        # 1. CHECK IF HOST
-        # Ensure we compare strings properly
-        host_id = str(queue.created_by).strip()
-        if host_id == discord_id:
-            await interaction.response.send_message("🛑 **Host Left:** Disbanding Queue...", ephemeral=True)
-            db.close()
-            await archive_queue(queue, "Disbanded by Host")
-            return
-
-        # 2. NORMAL MEMBER LEAVE
-        member = db.query(QueueMember).filter_by(queue_id=queue_id, discord_id=discord_id).first()
-        if member:
-            db.delete(member)
-            db.commit()
-            await interaction.response.send_message("👋 Left the queue.", ephemeral=True)
-            await update_queue_message(queue_id)
-        else:
-            await interaction.response.send_message("⚠️ You are not in this queue.", ephemeral=True)
-    finally:
-        # DB close handled in blocks or here if needed
-        pass
-    db.close() 
+    status, queue = await run_db(leave_as, str(interaction.user.id), queue_id)
+    if status == "not_found":
+        await interaction.response.send_message("⚠️ Queue not found.", ephemeral=True)
+    elif status == "disbanded":
+        # The host leaving disbands the queue
+        await interaction.response.send_message("🛑 **Host Left:** Disbanding Queue...", ephemeral=True)
+        archive_discord([queue], "Disbanded by Host")
+    elif status == "left":
+        await interaction.response.send_message("👋 Left the queue.", ephemeral=True)
+        await update_queue_message(queue_id, "leave")
+    else:
+        await interaction.response.send_message("⚠️ You are not in this queue.", ephemeral=True)
 
 async def handle_close(interaction: discord.Interaction, queue_id: int):
-    discord_id = str(interaction.user.id)
-    db = SessionLocal()
     try:
-        queue = db.query(Queue).filter_by(id=queue_id).first()
-        if not queue:
+        status, queue = await run_db(close_as, str(interaction.user.id), queue_id)
+        if status == "not_found":
             await interaction.response.send_message("⚠️ Queue not found.", ephemeral=True)
-            return
-            
-        host_id = str(queue.created_by).strip()
-        if host_id != discord_id:
+        elif status == "not_host":
             await interaction.response.send_message("❌ Only the **Host** can close this queue.", ephemeral=True)
-            return
-            
-        await interaction.response.send_message("🔒 Closing queue...", ephemeral=True)
-        db.close()
-        await archive_queue(queue, "Closed by Host")
+        else:
+            await interaction.response.send_message("🔒 Closing queue...", ephemeral=True)
+            archive_discord([queue], "Closed by Host")
         
     except Exception as e:
         await interaction.response.send_message(f"Error: {e}", ephemeral=True)
-    finally:
-        # DB close handled above
-        pass
+
+QUEUE_ACTIONS = {"join": handle_join, "leave": handle_leave, "close": handle_close}
 
 # --- AUTO-DELETE VOICE CHANNELS ---
 @bot.event
@@ -430,62 +582,226 @@ async def on_voice_state_update(member, before, after):
 
 # --- SYNC LOOP ---
 
-@tasks.loop(seconds=5)
+# queue_id -> fingerprint of the embed currently shown in Discord
+queue_fingerprints = {}
+# Running counters so the effect of skipping unchanged queues can be checked (!syncstats)
+sync_stats = {"ticks": 0, "edits": 0, "skipped": 0, "api_calls_saved": 0}
+# Every outbound REST call goes through here (see discord_ops.py)
+outbound = OutboundQueue()
+# Queues whose message was deleted under us; re-posted on the next tick
+lost_messages = set()
+
+def expires_in_minutes(q: Queue, now_naive=None):
+    now_naive = now_naive or datetime.now(timezone.utc).replace(tzinfo=None)
+    return int((q.expires_at - now_naive).total_seconds() / 60)
+
+def queue_fingerprint(q: Queue, now_naive=None):
+    # Everything build_embed renders; if this is unchanged the message is too
+    return (
+        q.boss,
+        q.role,
+        q.group_size,
+        q.description,
+        tuple((m.discord_id, m.rsn) for m in q.members),
+        expires_in_minutes(q, now_naive),
+    )
+
+# Set (thread-safely) whenever a queue_events notification arrives
+queue_changed = asyncio.Event()
+sync_lock = asyncio.Lock()
+
+# (expires_at, queue_id) heap, hydrated at startup and reconciled on every tick
+expiry_scheduler = ExpiryScheduler()
+schedule_changed = asyncio.Event()
+# Footers changing within this many seconds of each other are refreshed in one wake
+FOOTER_BATCH = 1.0
+# Wake this far past a minute boundary so the footer math sees the new minute
+FOOTER_SLACK = 0.05
+# queue_id -> detached Queue as of the last tick; every change to a queue triggers a
+# tick, so footer refreshes can render from here without reloading
+open_queues = {}
+
+def on_queue_event(event):
+    # Runs on the listener thread. Our own changes already woke the tick directly.
+    if queue_events.is_own(event):
+        return
+    bot.loop.call_soon_threadsafe(queue_changed.set)
+
+@tasks.loop(seconds=RECONCILE_INTERVAL)
 async def sync_queues():
     await bot.wait_until_ready()
+    async with sync_lock:
+        await sync_tick()
+
+async def watch_queue_events():
+    # Event-driven ticks; bursts of notifications collapse into one tick
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        await queue_changed.wait()
+        queue_changed.clear()
+        async with sync_lock:
+            await sync_tick()
+
+def load_expiries():
+    with session_scope() as db:
+        return db.query(Queue.id, Queue.expires_at).all()
+
+async def expiry_watcher():
+    # Sleeps until the next queue's footer minute changes (its expiry being the last
+    # change). Expiries wake the sync tick; footer changes are edited from open_queues
+    # without a reload. With no open queues it sleeps until the schedule changes.
+    await bot.wait_until_ready()
+    refreshed = datetime.now(timezone.utc).replace(tzinfo=None)
+    while not bot.is_closed():
+        wake, changing = expiry_scheduler.next_minute_change(refreshed, FOOTER_BATCH)
+        now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+        timeout = max((wake - now_naive).total_seconds(), 0) + FOOTER_SLACK if wake else None
+        try:
+            await asyncio.wait_for(schedule_changed.wait(), timeout)
+            schedule_changed.clear()
+            continue
+        except asyncio.TimeoutError:
+            pass
+
+        now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+        # Far behind (busy loop, many schedule changes): check every footer once
+        # instead of catching up change by change
+        late = (now_naive - wake).total_seconds() > FOOTER_BATCH
+        refreshed = now_naive if late else wake
+        # Expired queues are archived by the tick (which redraws every footer too);
+        # drop them here so we don't spin
+        if expiry_scheduler.pop_due(now_naive):
+            queue_changed.set()
+        else:
+            async with sync_lock:
+                refresh_footers(list(open_queues) if late else changing)
+
+def refresh_footers(queue_ids):
+    # Low-priority edits for posted queues whose "expires in" minute has moved on
+    channel = bot.get_channel(LFG_CHANNEL_ID)
+    if not channel:
+        return
+    now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+    for queue_id in queue_ids:
+        q = open_queues.get(queue_id)
+        if q is None or not q.discord_message_id or q.id in lost_messages:
+            continue
+        fingerprint = queue_fingerprint(q, now_naive)
+        if queue_fingerprints.get(q.id) == fingerprint:
+            continue
+        message_id = int(q.discord_message_id)
+        outbound.submit(
+            ("channel", channel.id), partial(edit_queue_message, channel, q.id, message_id, build_embed(q), fingerprint),
+            PRIORITY_LOW, key=("message", message_id),
+        )
+        queue_fingerprints[q.id] = fingerprint
+        sync_stats["edits"] += 1
+
+async def sync_tick():
     channel = bot.get_channel(LFG_CHANNEL_ID)
     
     if not channel:
         print(f"Error: LFG Channel {LFG_CHANNEL_ID} not found.")
         return
 
-    db = SessionLocal()
     try:
+        queues = await run_db(load_queues)
         # DB stores naive UTC, so we must compare with naive UTC
         now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
-        
-        # 1. PROCESS ACTIVE QUEUES
-        active_queues = db.query(Queue).filter(Queue.expires_at > now_naive).all()
-        
-        for q in active_queues:
-            # Update Message
-            embed = build_embed(q)
-            view = QueueView(q.id)
-            
-            if q.discord_message_id:
-                try:
-                    msg = await channel.fetch_message(int(q.discord_message_id))
-                    await msg.edit(embed=embed, view=view)
-                except discord.NotFound:
-                    # Message deleted manually? Re-post
-                    msg = await channel.send(embed=embed, view=view)
-                    q.discord_message_id = str(msg.id)
-                    db.commit()
-            else:
-                # New Queue
-                msg = await channel.send(embed=embed, view=view)
-                q.discord_message_id = str(msg.id)
-                db.commit()
-
-            # Check Voice Channel (Full Team)
-            if len(q.members) >= q.group_size:
-                if not q.discord_channel_id:
-                    await create_voice_channel(q, channel)
-
-        # 2. PROCESS EXPIRED QUEUES (Cleanup)
-        # Use Helper
-        expired_queues = db.query(Queue).filter(Queue.expires_at <= now_naive).all()
-        for q in expired_queues:
-            # We must close this DB session's query or just use the IDs, 
-            # because `archive_queue` creates a new session. 
-            # Actually, `archive_queue` works on ID logic so it's fine.
-            # But the object `q` is bound to `db`.
-            await archive_queue(q)
-        
+    
+        active_queues = [q for q in queues if q.expires_at > now_naive]
+        expired_queues = [q for q in queues if q.expires_at <= now_naive]
+
+        sync_stats["ticks"] += 1
+        if expiry_scheduler.sync((q.id, q.expires_at) for q in active_queues):
+            schedule_changed.set()
+        open_queues.clear()
+        open_queues.update((q.id, q) for q in active_queues)
+        # queue_id -> new Discord ids, written with one bulk UPDATE at the end
+        new_ids = {}
+        expired_ids = []
+        by_id = {q.id: q for q in active_queues}
+
+        # If a send fails partway, the finally still stores the ids of what was already
+        # posted, so the next tick doesn't post those queues (and their VCs) again
+        try:
+            # 1. PROCESS ACTIVE QUEUES
+
+            for q in active_queues:
+                fingerprint = queue_fingerprint(q, now_naive)
+
+                posted = q.discord_message_id and q.id not in lost_messages
+                old_fingerprint = queue_fingerprints.get(q.id)
+
+                if posted and old_fingerprint == fingerprint:
+                    # Nothing visible changed: skip the old fetch_message + edit pair
+                    sync_stats["skipped"] += 1
+                    sync_stats["api_calls_saved"] += 2
+                else:
+                    # Update Message
+                    embed = build_embed(q)
+
+                    if posted:
+                        # Queued, not awaited: a newer edit of the same message replaces this one
+                        # if it hasn't gone out yet. Footer-only changes yield to everything else.
+                        message_id = int(q.discord_message_id)
+                        footer_only = old_fingerprint is not None and old_fingerprint[:-1] == fingerprint[:-1]
+                        outbound.submit(
+                            ("channel", channel.id), partial(edit_queue_message, channel, q.id, message_id, embed, fingerprint),
+                            PRIORITY_LOW if footer_only else PRIORITY_NORMAL, key=("message", message_id),
+                        )
+                        sync_stats["edits"] += 1
+                        sync_stats["api_calls_saved"] += 1
+                    else:
+                        # New Queue (or its message was deleted manually)
+                        msg = await outbound.submit(("channel", channel.id), partial(channel.send, embed=embed, view=QueueView(q.id)), PRIORITY_HIGH)
+                        new_ids.setdefault(q.id, {})["discord_message_id"] = q.discord_message_id = str(msg.id)
+                        lost_messages.discard(q.id)
+
+                    queue_fingerprints[q.id] = fingerprint
+
+                # Check Voice Channel (Full Team)
+                if len(q.members) >= q.group_size:
+                    if not q.discord_channel_id:
+                        vc_id = await create_voice_channel(q, channel)
+                        if vc_id:
+                            new_ids.setdefault(q.id, {})["discord_channel_id"] = q.discord_channel_id = vc_id
+
+            # 2. PROCESS EXPIRED QUEUES (Cleanup)
+            archive_discord(expired_queues)
+            expired_ids = [q.id for q in expired_queues]
+        finally:
+            await run_db(save_tick, expired_ids, [
+                {
+                    "id": queue_id,
+                    "discord_message_id": ids.get("discord_message_id", by_id[queue_id].discord_message_id),
+                    "discord_channel_id": ids.get("discord_channel_id", by_id[queue_id].discord_channel_id),
+                }
+                for queue_id, ids in new_ids.items()
+            ])
+
     except Exception as e:
         print(f"Sync Loop Error: {e}")
-    finally:
-        db.close()
+
+async def edit_queue_message(channel, queue_id, message_id, embed, fingerprint):
+    # The caller records ``fingerprint`` when queueing, so later ticks don't queue the
+    # same edit again; a failure clears it so the next tick retries, a success restores it
+    try:
+        # Partial message: edit by id without fetching it first. The buttons never
+        # change, so the components already on the message are left alone.
+        await channel.get_partial_message(message_id).edit(embed=embed)
+    except discord.NotFound:
+        # Message deleted manually? Re-post on the next tick
+        lost_messages.add(queue_id)
+        queue_fingerprints.pop(queue_id, None)
+        queue_changed.set()
+    except Exception:
+        # 5xx, Forbidden, or a 429 (outbound may still retry this op)
+        queue_fingerprints.pop(queue_id, None)
+        raise
+    else:
+        if queue_id in open_queues:
+            queue_fingerprints[queue_id] = fingerprint
 
 def build_embed(q: Queue):
     is_full = len(q.members) >= q.group_size
@@ -502,8 +818,7 @@ def build_embed(q: Queue):
     embed.add_field(name="Members", value=member_list if member_list else "None", inline=False)
     
     # Calculate expiry using naive UTC math
-    now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
-    expires_in = int((q.expires_at - now_naive).total_seconds() / 60)
+    expires_in = expires_in_minutes(q)
     embed.set_footer(text=f"Expires in {expires_in} mins | ID: {q.id}")
     
     return embed
@@ -524,38 +839,45 @@ async def create_voice_channel(q: Queue, text_channel):
     
     # Allow members
     channel_name = f"{q.boss} - Team {q.id}"
-    vc = await guild.create_voice_channel(channel_name, category=category)
-    
-    db = SessionLocal()
     try:
-        q_update = db.query(Queue).filter_by(id=q.id).first()
-        q_update.discord_channel_id = str(vc.id)
-        db.commit()
-        
-        # Build Mentions
-        mentions = " ".join([f"<@{m.discord_id}>" for m in q.members])
-        
-        # Notify
-        await text_channel.send(
-            f"✅ **Queue Full!** {mentions}\nVoice Channel Created: {vc.mention}",
-            view=JoinVCView(vc.jump_url)
+        vc = await outbound.submit(
+            ("guild", guild.id), partial(guild.create_voice_channel, channel_name, category=category), PRIORITY_HIGH
         )
-        
     except Exception as e:
         print(f"VC Create Error: {e}")
-    finally:
-        db.close()
+        return
+
+    # Build Mentions
+    mentions = " ".join([f"<@{m.discord_id}>" for m in q.members])
+    
+    # Notify (ahead of any queued edits in the channel)
+    outbound.submit(("channel", text_channel.id), partial(
+        text_channel.send,
+        f"✅ **Queue Full!** {mentions}\nVoice Channel Created: {vc.mention}",
+        view=JoinVCView(vc.jump_url)
+    ), PRIORITY_HIGH)
+
+    # The caller stores this on the queue
+    return str(vc.id)
 
 # --- UPDATE HELPER ---
-async def update_queue_message(queue_id):
-    # Triggers the loop logic immediately/forcefully or waits for next cycle
-    # Since loop runs every 5s, we can just wait.
-    pass
+async def update_queue_message(queue_id, event):
+    # Wake our own sync loop now and tell other processes (web app) about the change
+    queue_changed.set()
+    publish_event(event, queue_id)
 
 @bot.event
 async def on_ready():
     print(f"Bot connected as {bot.user}")
-    sync_queues.start()
+    if not sync_queues.is_running():
+        # Expiries are known before the first tick, so the watcher starts with the full schedule
+        now_naive = datetime.now(timezone.utc).replace(tzinfo=None)
+        expiry_scheduler.hydrate((queue_id, expires_at) for queue_id, expires_at in await run_db(load_expiries)
+                                 if expires_at > now_naive)
+        queue_events.listen(on_queue_event)
+        bot.loop.create_task(watch_queue_events())
+        bot.loop.create_task(expiry_watcher())
+        sync_queues.start()
 
 if __name__ == "__main__":
     bot.run(TOKEN)
@@ -0,0 +1,126 @@
+# build_assets.py
+#
+# Builds static/dist/ from static/: resized AVIF/WebP/JPEG-or-PNG variants of
+# the images, gzip and brotli copies of CSS/JS, all under content-hashed names,
+# plus static/dist/manifest.json. assets.py reads the manifest to emit srcsets
+# and serves these files with an immutable Cache-Control.
+#
+#   python build_assets.py
+#
+# Runs at deploy time (bin/post_compile). Without a manifest the templates fall
+# back to the original files, so local development needs no build.
+#
+# Needs Pillow (with AVIF support, Pillow >= 11.3 wheels) and Brotli.
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import brotli
+from PIL import Image, features
+
+from assets import DIST_DIR, MANIFEST, STATIC_DIR
+
+# Widths (px) to emit per image, chosen from how the templates display them;
+# anything else under img/ that is large gets DEFAULT_WIDTHS
+IMAGE_WIDTHS = {
+    "img/bosscape_banner.png": [480, 768, 1024, 1280, 1536],  # hero, full width up to its natural size
+    "img/discord_dp.png": [48, 96, 144],  # navbar logo, 48px high
+    "img/bosscape_icon.png": [32, 180, 192],  # favicon, touch icons
+}
+DEFAULT_WIDTHS = [480, 960, 1536]
+SMALL_IMAGE = 8 * 1024  # bytes; below this (skill icons) just fingerprint the original
+
+QUALITY = {"avif": 50, "webp": 78, "jpeg": 80}
+TEXT_TYPES = (".css", ".js", ".svg")
+
+
+def fingerprint(relpath, data):
+    # img/foo.png -> img/foo.<hash>.png
+    root, ext = os.path.splitext(relpath)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def write(relpath, data):
+    path = os.path.join(DIST_DIR, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def encode(image, fmt):
+    out = io.BytesIO()
+    if fmt == "avif":
+        image.save(out, "AVIF", quality=QUALITY["avif"], speed=6)
+    elif fmt == "webp":
+        image.save(out, "WEBP", quality=QUALITY["webp"], method=6)
+    elif fmt == "jpeg":
+        image.convert("RGB").save(out, "JPEG", quality=QUALITY["jpeg"], optimize=True, progressive=True)
+    else:
+        image.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+def build_image(relpath, widths):
+    source = Image.open(os.path.join(STATIC_DIR, relpath))
+    has_alpha = source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info)
+    source = source.convert("RGBA" if has_alpha else "RGB")
+    fallback = "png" if has_alpha else "jpeg"
+    formats = (["avif"] if features.check("avif") else []) + ["webp", fallback]
+
+    widths = sorted({min(w, source.width) for w in widths})
+    entry = {"width": source.width, "height": source.height, "fallback": fallback, "variants": {f: [] for f in formats}}
+    root = os.path.splitext(relpath)[0]
+    for width in widths:
+        height = round(source.height * width / source.width)
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            data = encode(resized, fmt)
+            name = fingerprint(f"{root}.{width}.{'jpg' if fmt == 'jpeg' else fmt}", data)
+            write(name, data)
+            entry["variants"][fmt].append([width, name])
+    # Plain asset_url() of the image: the largest fallback
+    entry["file"] = entry["variants"][fallback][-1][1]
+    return entry
+
+
+def build_file(relpath):
+    with open(os.path.join(STATIC_DIR, relpath), "rb") as f:
+        data = f.read()
+    name = fingerprint(relpath, data)
+    write(name, data)
+    if relpath.endswith(TEXT_TYPES):
+        write(name + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+        write(name + ".br", brotli.compress(data, quality=11))
+    return {"file": name}
+
+
+def main():
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    manifest = {}
+    original = built = 0
+    for dirpath, dirnames, filenames in os.walk(STATIC_DIR):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != DIST_DIR]
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+            size = os.path.getsize(path)
+            is_image = filename.lower().endswith((".png", ".jpg", ".jpeg"))
+            if is_image and (relpath in IMAGE_WIDTHS or size > SMALL_IMAGE):
+                manifest[relpath] = build_image(relpath, IMAGE_WIDTHS.get(relpath, DEFAULT_WIDTHS))
+            else:
+                manifest[relpath] = build_file(relpath)
+            largest = os.path.getsize(os.path.join(DIST_DIR, manifest[relpath]["file"]))
+            original += size
+            built += largest
+            print(f"{relpath}: {size / 1024:.1f} KB -> {largest / 1024:.1f} KB ({manifest[relpath]['file']})")
+
+    write(MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    print(f"{len(manifest)} assets, {original / 1024:.0f} KB -> {built / 1024:.0f} KB at full size, manifest in {DIST_DIR}")
+
+
+if __name__ == "__main__":
+    main()
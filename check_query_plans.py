@@ -0,0 +1,200 @@
+# check_query_plans.py
+#
+# Seeds a scratch database at realistic row counts, runs the hot read paths
+# (sync tick, queue listing and joins, stats page, snapshot history, rollups
+# and leaderboards), and EXPLAINs every statement they issue. Exits non-zero if
+# any of them falls back to a full table scan (SQLite "SCAN <table>", Postgres
+# "Seq Scan on <table>").
+#
+#   python check_query_plans.py                    # throwaway SQLite file
+#   DATABASE_URL=postgresql://.../scratch python check_query_plans.py
+#
+# It writes seed data (bench/_common.py), so only point DATABASE_URL at a
+# scratch database.
+
+import argparse
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench"))
+import _common  # first: a throwaway database unless DATABASE_URL is set
+
+import numpy as np
+from sqlalchemy import event, func, insert, text
+from sqlalchemy.orm import joinedload
+
+import migrate
+from db import SessionLocal, engine
+from leaderboards import LeaderboardEngine
+from models import Queue, QueueMember, StatSnapshot, User, XpGainRollup
+from queue_ops import join_queue, queues_version, remove_member
+from rollups import gains_for_period, latest_xp
+from hiscore_layout import SKILLS
+from snapshot_codec import encode_arrays, pack_array
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def seed(users, snapshots_per_user, queues, members_per_queue):
+    now = datetime.utcnow()
+    snapshot = encode_arrays(np.ones((3, len(SKILLS)), dtype=np.int64))
+    gains = pack_array(np.ones(len(SKILLS), dtype=np.int64))
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM users")).scalar():
+            print("Database already seeded; reusing it.")
+            return
+        _common.insert_users(conn, 1, users, now)
+        conn.execute(insert(StatSnapshot), [
+            {"user_id": u, "timestamp": now - timedelta(hours=h), "data": snapshot}
+            for u in range(1, users + 1) for h in range(snapshots_per_user)
+        ])
+        conn.execute(insert(XpGainRollup), [
+            {"user_id": u, "granularity": granularity, "bucket_start": now - step * n, "gains": gains}
+            for u in range(1, users + 1)
+            for granularity, step, buckets in (("hour", timedelta(hours=1), 24), ("day", timedelta(days=1), 30))
+            for n in range(buckets)
+        ])
+        # A peak evening: most queues live, a tail about to expire
+        _common.insert_queues(conn, queues, members_per_queue, users=users, now=now, group_size=members_per_queue + 1,
+                              expires_at=lambda q: now + timedelta(minutes=(q % 180) - 10))
+        conn.execute(text("ANALYZE"))
+
+
+# Each check mirrors the queries of the code path it is named after
+
+
+def sync_tick(db):
+    # bot.sync_tick
+    db.query(Queue).options(joinedload(Queue.members)).order_by(Queue.id).all()
+
+
+def list_queues(db):
+    # routes/queue.py render_cards: versions and the viewer's memberships, then a cache miss
+    now = datetime.utcnow()
+    rows = db.query(Queue.id, Queue.version).filter(Queue.expires_at > now).order_by(Queue.created_at.desc()).all()
+    ids = [row.id for row in rows]
+    db.query(QueueMember.queue_id).filter(QueueMember.discord_id == "42", QueueMember.queue_id.in_(ids)).all()
+    queues = db.query(Queue).options(joinedload(Queue.members)).filter(Queue.expires_at > now, Queue.id.in_(ids[:5])).all()
+    db.query(User).filter(User.discord_id.in_([q.created_by for q in queues])).all()
+
+
+def queue_api(db):
+    # routes/queue.py api_queues: the ETag lookup, then a filtered page
+    now = datetime.utcnow()
+    queues_version(db, now)
+    (
+        db.query(Queue).options(joinedload(Queue.members))
+        .filter(Queue.expires_at > now, Queue.boss == "ToB").order_by(Queue.id.desc()).limit(21).all()
+    )
+
+
+def join_and_leave(db):
+    # queue_ops, used by /queue/join and the Discord Join button
+    queue_id = db.query(func.max(Queue.id)).scalar()
+    join_queue(db, queue_id, "plan-check", "Plan Check")
+    remove_member(db, queue_id, "plan-check")
+
+
+def stats_page(db):
+    # app.view_stats and its gains endpoint
+    user = db.query(User).filter(func.lower(User.rsn) == "player 42").first()
+    cutoff = datetime.utcnow() - timedelta(hours=1)
+    (
+        db.query(StatSnapshot)
+        .filter(StatSnapshot.user_id == user.id, StatSnapshot.timestamp >= cutoff)
+        .order_by(StatSnapshot.timestamp.desc()).first()
+    )
+    gains_for_period(db, user.id, "week")
+
+
+def snapshot_history(db):
+    # One player's snapshots over a window, and the collector's latest-per-user lookup
+    since = datetime.utcnow() - timedelta(days=2)
+    db.query(StatSnapshot).filter(StatSnapshot.user_id == 42, StatSnapshot.timestamp >= since).order_by(StatSnapshot.timestamp).all()
+    latest_xp(db, list(range(1, 201)))
+
+
+def leaderboard_gains(db):
+    # leaderboards._build_gains
+    LeaderboardEngine().query(db, "Attack", "week")
+
+
+CHECKS = [
+    # The tick reads every live queue by design; the table only holds live queues
+    ("sync tick", sync_tick, {"queues"}),
+    ("list_queues", list_queues, set()),
+    # The page walks the primary key backwards and stops at the limit; anon_1 is
+    # the LIMIT subquery SQLAlchemy wraps around a joinedload
+    ("queue api", queue_api, {"queues", "anon_1"}),
+    ("join/leave", join_and_leave, set()),
+    ("stats page", stats_page, set()),
+    ("snapshot history", snapshot_history, set()),
+    ("leaderboard gains", leaderboard_gains, set()),
+]
+
+
+def explain(statement, parameters):
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            lines = [row[-1] for row in rows]
+            scans = {m.group(1) for m in map(_SQLITE_SCAN.match, lines) if m}
+        else:
+            lines = [row[0] for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters)]
+            scans = {m.group(1) for line in lines for m in _POSTGRES_SCAN.finditer(line)}
+    return lines, scans
+
+
+def run_check(label, run, allow_scan, verbose):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    db = SessionLocal()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        run(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        db.close()
+
+    failures = 0
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            continue
+        lines, scans = explain(statement, parameters)
+        bad = scans - allow_scan
+        if bad or verbose:
+            print(f"  {' '.join(statement.split())[:160]}")
+            for line in lines:
+                print(f"      {line}")
+        if bad:
+            print(f"  !! full scan of {', '.join(sorted(bad))}")
+            failures += 1
+    print(f"[{'FAIL' if failures else 'ok'}] {label}: {len(statements)} statements")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if hot queries fall back to full table scans")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--snapshots-per-user", type=int, default=50)
+    parser.add_argument("--queues", type=int, default=300)
+    parser.add_argument("--members-per-queue", type=int, default=4)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    migrate.upgrade()
+    seed(args.users, args.snapshots_per_user, args.queues, args.members_per_queue)
+    print(f"Checking query plans on {engine.dialect.name}...")
+    failures = sum(run_check(label, run, allow_scan, args.verbose) for label, run, allow_scan in CHECKS)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# collector.py
+#
+# Standalone worker that snapshots hiscores for every linked user.
+# Run next to the bot:  python collector.py  (or  python collector.py --once)
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import insert
+
+from db import SessionLocal
+from models import User, StatSnapshot
+from hiscores import client, parse_batch, NOT_FOUND
+from snapshot_codec import encode_arrays
+from rollups import latest_xp, apply_snapshots
+
+load_dotenv()
+
+INTERVAL = int(os.getenv("COLLECTOR_INTERVAL", 3600))  # seconds between cycles
+CONCURRENCY = int(os.getenv("COLLECTOR_CONCURRENCY", 8))  # parallel fetches
+RATE = float(os.getenv("COLLECTOR_RATE", 5))  # upstream requests per second
+BATCH_SIZE = int(os.getenv("COLLECTOR_BATCH_SIZE", 200))  # rows per INSERT
+
+
+class RateLimiter:
+    # Token bucket shared by all fetch threads
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_snapshot(limiter, user_id, rsn):
+    limiter.acquire()
+    text = client.fetch(rsn)
+    if text is None or text is NOT_FOUND:
+        return None
+    return {"user_id": user_id, "timestamp": datetime.utcnow(), "text": text}
+
+
+def flush(fetched, previous):
+    if not fetched:
+        return
+    # Parse the whole batch in one vectorized pass
+    skills, activities = parse_batch(f["text"] for f in fetched)
+    rows = [
+        {"user_id": f["user_id"], "timestamp": f["timestamp"], "data": encode_arrays(skills[i].T, activities[i].T)}
+        for i, f in enumerate(fetched)
+    ]
+
+    db = SessionLocal()
+    try:
+        # Rollups need each user's prior XP, so read it before inserting
+        missing = [r["user_id"] for r in rows if r["user_id"] not in previous]
+        previous.update(latest_xp(db, missing))
+        db.execute(insert(StatSnapshot), rows)
+        apply_snapshots(db, rows, previous)
+        db.commit()
+    finally:
+        db.close()
+
+
+def collect_once(rate=RATE, concurrency=CONCURRENCY, batch_size=BATCH_SIZE):
+    db = SessionLocal()
+    try:
+        users = db.query(User.id, User.rsn).all()
+    finally:
+        db.close()
+
+    limiter = RateLimiter(rate)
+    previous = {}  # user_id -> last stored XP vector
+    batch = []
+    stored = failed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(fetch_snapshot, limiter, u.id, u.rsn) for u in users]
+        for future in futures:
+            row = future.result()
+            if row is None:
+                failed += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush(batch, previous)
+                stored += len(batch)
+                batch = []
+
+    flush(batch, previous)
+    stored += len(batch)
+    print(f"[Collector] Stored {stored} snapshots ({failed} failed) for {len(users)} users")
+    return stored
+
+
+def main():
+    once = "--once" in sys.argv
+    while True:
+        started = time.monotonic()
+        try:
+            collect_once()
+        except Exception as e:
+            print(f"[Collector] Cycle Error: {e}")
+        if once:
+            return
+        time.sleep(max(0, INTERVAL - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
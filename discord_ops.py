@@ -0,0 +1,169 @@
+# discord_ops.py
+#
+# Outbound queue for the bot's Discord REST calls (sends, edits, deletes, VC
+# creation). Work is grouped per rate-limit bucket, e.g. ("channel", id) or
+# ("guild", id). Each bucket runs its own worker, so a 429 on one channel only
+# pauses that channel. Within a bucket ops run by priority, and pending ops
+# that share a key (e.g. edits of one message) are coalesced into the newest.
+
+import asyncio
+import heapq
+import itertools
+
+PRIORITY_HIGH = 0  # user-visible: full-team pings, VC creation, new queue posts
+PRIORITY_NORMAL = 1  # membership edits, deletes, archive posts
+PRIORITY_LOW = 2  # footer ("expires in N mins") refreshes
+
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def _retry_after(error):
+    # Seconds to back off if ``error`` is a rate limit, otherwise None
+    if getattr(error, "status", None) != 429 and not hasattr(error, "retry_after"):
+        return None
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("Retry-After")
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"[Outbound] Operation failed: {future.exception()}")
+
+
+class _Op:
+    __slots__ = ("priority", "func", "futures", "key", "attempts", "done")
+
+    def __init__(self, priority, func, key):
+        self.priority = priority
+        self.func = func
+        self.futures = []
+        self.key = key
+        self.attempts = 0
+        self.done = False
+
+
+class _Bucket:
+    def __init__(self):
+        self.heap = []  # (priority, seq, op); entries for finished ops are skipped
+        self.pending = {}  # coalesce key -> queued op
+        self.blocked_until = 0.0
+        self.worker = None
+
+
+class OutboundQueue:
+    def __init__(self, max_attempts=5):
+        self.max_attempts = max_attempts
+        self.buckets = {}
+        self._seq = itertools.count()
+        self.stats = {"submitted": 0, "executed": 0, "coalesced": 0, "rate_limited": 0, "failed": 0}
+
+    def submit(self, bucket, func, priority=PRIORITY_NORMAL, key=None):
+        """Queue ``func`` (an async callable taking no arguments) on ``bucket``.
+
+        Returns a future for its result. If an op with the same ``key`` is still
+        pending in the bucket, it is replaced by ``func`` and both callers get
+        the single result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(_log_failure)
+        self.stats["submitted"] += 1
+
+        b = self.buckets.get(bucket)
+        if b is None:
+            b = self.buckets[bucket] = _Bucket()
+
+        op = b.pending.get(key) if key is not None else None
+        if op is not None:
+            op.func = func
+            self.stats["coalesced"] += 1
+            if priority < op.priority:
+                op.priority = priority
+                heapq.heappush(b.heap, (priority, next(self._seq), op))
+        else:
+            op = _Op(priority, func, key)
+            if key is not None:
+                b.pending[key] = op
+            heapq.heappush(b.heap, (priority, next(self._seq), op))
+        op.futures.append(future)
+
+        if b.worker is None or b.worker.done():
+            b.worker = loop.create_task(self._run(b))
+        return future
+
+    def discard(self, bucket, key):
+        # Drop a pending keyed op (e.g. an edit of a message about to be deleted); its callers get None
+        b = self.buckets.get(bucket)
+        op = b.pending.pop(key, None) if b else None
+        if op is None:
+            return False
+        op.done = True
+        for future in op.futures:
+            if not future.done():
+                future.set_result(None)
+        return True
+
+    def pending(self):
+        return sum(len(b.pending) for b in self.buckets.values())
+
+    async def drain(self):
+        # Wait until every bucket is idle (used by tests and shutdown)
+        while True:
+            workers = [b.worker for b in self.buckets.values() if b.worker and not b.worker.done()]
+            if not workers:
+                return
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _run(self, b):
+        loop = asyncio.get_running_loop()
+        while b.heap:
+            delay = b.blocked_until - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            _, _, op = heapq.heappop(b.heap)
+            if op.done:
+                continue
+            op.done = True
+            if op.key is not None and b.pending.get(op.key) is op:
+                # Anything submitted from now on is a new op
+                del b.pending[op.key]
+
+            try:
+                result = await op.func()
+            except Exception as e:
+                retry_after = _retry_after(e)
+                if retry_after is not None and op.attempts + 1 < self.max_attempts:
+                    self.stats["rate_limited"] += 1
+                    op.attempts += 1
+                    b.blocked_until = loop.time() + retry_after
+                    self._requeue(b, op)
+                    continue
+                self.stats["failed"] += 1
+                for future in op.futures:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.stats["executed"] += 1
+                for future in op.futures:
+                    if not future.done():
+                        future.set_result(result)
+
+    def _requeue(self, b, op):
+        newer = b.pending.get(op.key) if op.key is not None else None
+        if newer is not None:
+            # A newer version was queued meanwhile; it answers our callers too
+            newer.futures.extend(op.futures)
+            newer.priority = min(newer.priority, op.priority)
+            heapq.heappush(b.heap, (newer.priority, next(self._seq), newer))
+            return
+        op.done = False
+        if op.key is not None:
+            b.pending[op.key] = op
+        heapq.heappush(b.heap, (op.priority, next(self._seq), op))
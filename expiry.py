@@ -0,0 +1,149 @@
+# expiry.py
+
+import heapq
+import itertools
+from datetime import timedelta
+
+
+class ExpiryScheduler:
+    """Min-heap of (expires_at, queue_id) with lazy invalidation.
+
+    Rescheduling or cancelling a queue only updates ``_due``; stale heap
+    entries are discarded when they reach the top. A second heap, of each
+    queue's next footer change, is kept the same way for next_minute_change.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}  # queue_id -> current expires_at
+        self._changes = []  # (next footer change, seq, queue_id)
+        self._placed = {}  # queue_id -> seq of its current entry in _changes
+        self._unplaced = set()  # queue_ids scheduled since the last next_minute_change
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, queue_id):
+        return queue_id in self._due
+
+    def schedule(self, queue_id, expires_at):
+        # Returns True if this changed the schedule
+        if self._due.get(queue_id) == expires_at:
+            return False
+        self._due[queue_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, queue_id))
+        self._unplaced.add(queue_id)
+        return True
+
+    def cancel(self, queue_id):
+        self._placed.pop(queue_id, None)
+        return self._due.pop(queue_id, None) is not None
+
+    def hydrate(self, pairs):
+        # Replace the schedule with [(queue_id, expires_at), ...]
+        self._due = dict(pairs)
+        self._heap = [(expires_at, queue_id) for queue_id, expires_at in self._due.items()]
+        heapq.heapify(self._heap)
+        self._changes = []
+        self._placed = {}
+        self._unplaced = set(self._due)
+
+    def sync(self, pairs):
+        """Reconcile with the queues currently in the database; returns True if anything changed."""
+        pairs = dict(pairs)
+        changed = False
+        for queue_id in [q for q in self._due if q not in pairs]:
+            changed |= self.cancel(queue_id)
+        for queue_id, expires_at in pairs.items():
+            changed |= self.schedule(queue_id, expires_at)
+        return changed
+
+    def _prune(self):
+        while self._heap:
+            expires_at, queue_id = self._heap[0]
+            if self._due.get(queue_id) == expires_at:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def next_minute_change(self, after, window=0.0):
+        """When an "expires in N mins" footer next changes after ``after``, and for which queues.
+
+        N is whole minutes left, rounded down, so each queue's N drops once a
+        minute at its own second (expires_at - 60k). Returns (when, queue_ids)
+        covering every change within ``window`` seconds of the first one, or
+        (None, []) when nothing is scheduled. Overdue expiries are due at once.
+
+        ``after`` must not go backwards between calls: only the changes it has
+        passed are moved on to their next minute, so a wake costs O(k log n)
+        for the k queues changing rather than a pass over all n.
+        """
+        for queue_id in self._unplaced:
+            if queue_id in self._due:
+                self._place(queue_id, after)
+        self._unplaced.clear()
+
+        # Changes up to ``after`` (to rounding) were already handled: move them
+        # on to their next minute. Overdue expiries stay due.
+        cutoff = after + timedelta(seconds=0.001)
+        handled, overdue = [], []
+        while self._changes and self._changes[0][0] <= cutoff:
+            entry = heapq.heappop(self._changes)
+            when, seq, queue_id = entry
+            if self._placed.get(queue_id) != seq:
+                continue
+            if when == self._due[queue_id] and when <= after:
+                overdue.append(entry)
+            else:
+                handled.append(queue_id)
+        for entry in overdue:
+            heapq.heappush(self._changes, entry)
+        for queue_id in handled:
+            self._place(queue_id, after)
+
+        self._prune_changes()
+        if not self._changes:
+            return None, []
+
+        cutoff = self._changes[0][0] + timedelta(seconds=window)
+        due = []
+        while self._changes and self._changes[0][0] <= cutoff:
+            entry = heapq.heappop(self._changes)
+            if self._placed.get(entry[2]) == entry[1]:
+                due.append(entry)
+        # They stay scheduled until a later ``after`` passes them
+        for entry in due:
+            heapq.heappush(self._changes, entry)
+        return due[-1][0], [queue_id for _, _, queue_id in due]
+
+    def _prune_changes(self):
+        while self._changes and self._placed.get(self._changes[0][2]) != self._changes[0][1]:
+            heapq.heappop(self._changes)
+
+    def _place(self, queue_id, after):
+        # Schedule the first change of ``queue_id``'s footer after ``after``
+        expires_at = self._due[queue_id]
+        left = (expires_at - after).total_seconds()
+        if left <= 0:
+            when = expires_at
+        else:
+            step = left % 60
+            when = after + timedelta(seconds=step if step >= 0.001 else step + 60)
+        seq = self._placed[queue_id] = next(self._seq)
+        heapq.heappush(self._changes, (when, seq, queue_id))
+
+    def pop_due(self, now):
+        # Queue ids whose expiry is at or before ``now``, earliest first
+        due = []
+        self._prune()
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, queue_id = heapq.heappop(self._heap)
+            del self._due[queue_id]
+            self._placed.pop(queue_id, None)
+            due.append(queue_id)
+            self._prune()
+        return due
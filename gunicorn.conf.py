@@ -0,0 +1,34 @@
+# gunicorn.conf.py
+#
+# gevent workers: /queue/stream holds a connection open per browser, which
+# would pin a sync worker each. With gevent an idle stream is a parked
+# greenlet, and one worker serves up to WEB_WORKER_CONNECTIONS of them.
+
+import os
+
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", 1000))
+# Worker heartbeat; with gevent it does not cap how long a stream stays open
+timeout = 30
+
+
+def post_worker_init(worker):
+    # psycopg2 blocks in C; route its waits through the gevent hub so one slow
+    # query doesn't stall every greenlet in the worker
+    import psycopg2.extensions
+    from gevent.socket import wait_read, wait_write
+
+    def gevent_wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == psycopg2.extensions.POLL_OK:
+                break
+            elif state == psycopg2.extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == psycopg2.extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    psycopg2.extensions.set_wait_callback(gevent_wait_callback)
@@ -0,0 +1,38 @@
+# hiscore_layout.py
+#
+# The fixed line layout of index_lite.ws responses. Kept apart from hiscores.py
+# so that modules which only need the layout (snapshot_codec, and through it
+# models) don't pull in the HTTP client.
+
+SKILLS = [
+    "Overall", "Attack", "Defence", "Strength", "Hitpoints", "Ranged",
+    "Prayer", "Magic", "Cooking", "Woodcutting", "Fletching", "Fishing",
+    "Firemaking", "Crafting", "Smithing", "Mining", "Herblore", "Agility",
+    "Thieving", "Slayer", "Farming", "Runecraft", "Hunter", "Construction",
+    "Sailing"
+]
+
+# Activity/boss lines follow the skills, in the order Jagex publishes them.
+# The layout is positional, so new entries must be appended where Jagex adds them.
+ACTIVITIES = [
+    "League Points", "Deadman Points", "Bounty Hunter - Hunter", "Bounty Hunter - Rogue",
+    "Bounty Hunter (Legacy) - Hunter", "Bounty Hunter (Legacy) - Rogue",
+    "Clue Scrolls (all)", "Clue Scrolls (beginner)", "Clue Scrolls (easy)", "Clue Scrolls (medium)",
+    "Clue Scrolls (hard)", "Clue Scrolls (elite)", "Clue Scrolls (master)",
+    "LMS - Rank", "PvP Arena - Rank", "Soul Wars Zeal", "Rifts closed", "Colosseum Glory",
+    "Collections Logged",
+    "Abyssal Sire", "Alchemical Hydra", "Amoxliatl", "Araxxor", "Artio", "Barrows Chests",
+    "Bryophyta", "Callisto", "Calvar'ion", "Cerberus", "Chambers of Xeric",
+    "Chambers of Xeric: Challenge Mode", "Chaos Elemental", "Chaos Fanatic", "Commander Zilyana",
+    "Corporeal Beast", "Crazy Archaeologist", "Dagannoth Prime", "Dagannoth Rex",
+    "Dagannoth Supreme", "Deranged Archaeologist", "Doom of Mokhaiotl", "Duke Sucellus",
+    "General Graardor", "Giant Mole", "Grotesque Guardians", "Hespori", "Kalphite Queen",
+    "King Black Dragon", "Kraken", "Kree'Arra", "K'ril Tsutsaroth", "Lunar Chests", "Mimic",
+    "Nex", "Nightmare", "Phosani's Nightmare", "Obor", "Phantom Muspah", "Sarachnis", "Scorpia",
+    "Scurrius", "Shellbane Gryphon", "Skotizo", "Sol Heredit", "Spindel", "Tempoross",
+    "The Gauntlet", "The Corrupted Gauntlet", "The Hueycoatl", "The Leviathan",
+    "The Royal Titans", "The Whisperer", "Theatre of Blood", "Theatre of Blood: Hard Mode",
+    "Thermonuclear Smoke Devil", "Tombs of Amascut", "Tombs of Amascut: Expert Mode",
+    "TzKal-Zuk", "TzTok-Jad", "Vardorvis", "Venenatis", "Vet'ion", "Vorkath", "Wintertodt",
+    "Yama", "Zalcano", "Zulrah"
+]
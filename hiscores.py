@@ -0,0 +1,372 @@
+# hiscores.py
+
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from hiscore_layout import ACTIVITIES, SKILLS
+
+HISCORE_URL = os.getenv(
+    "HISCORE_URL", "https://secure.runescape.com/m=hiscore_oldschool/index_lite.ws"
+)
+
+# Cache tuning (seconds / entries)
+CACHE_SIZE = int(os.getenv("HISCORE_CACHE_SIZE", 2048))
+CACHE_TTL = int(os.getenv("HISCORE_CACHE_TTL", 300))
+STALE_TTL = int(os.getenv("HISCORE_STALE_TTL", 3600))  # how long past TTL we may still serve
+NEGATIVE_TTL = int(os.getenv("HISCORE_NEGATIVE_TTL", 120))
+
+# HTTP client tuning
+POOL_SIZE = int(os.getenv("HISCORE_POOL_SIZE", 10))
+CONNECT_TIMEOUT = float(os.getenv("HISCORE_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("HISCORE_READ_TIMEOUT", 5))
+RETRIES = int(os.getenv("HISCORE_RETRIES", 2))
+BACKOFF = float(os.getenv("HISCORE_BACKOFF", 0.3))
+
+NOT_FOUND = object()  # cached marker for "player not found"
+
+COMBAT_SKILLS = ("Attack", "Strength", "Defence", "Hitpoints", "Prayer", "Ranged", "Magic")
+_COMBAT_IDX = [SKILLS.index(s) for s in COMBAT_SKILLS]
+
+# Flat index_lite layout: 3 values per skill line, then 2 per activity line
+_SKILL_VALUES = len(SKILLS) * 3
+_LITE_VALUES = _SKILL_VALUES + len(ACTIVITIES) * 2
+
+
+def normalize_rsn(rsn):
+    # Jagex treats case, spaces, underscores and hyphens as equivalent
+    name = (rsn or "").strip().lower().replace("_", " ").replace("-", " ")
+    return " ".join(name.split())
+
+
+class HiscoreCache:
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, stale_ttl=STALE_TTL, negative_ttl=NEGATIVE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (value, state) where state is "fresh", "stale" or None (miss)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, None
+            value, stored_at = entry
+            age = now - stored_at
+
+            if value is NOT_FOUND:
+                if age < self.negative_ttl:
+                    self._data.move_to_end(key)
+                    return value, "fresh"
+                del self._data[key]
+                return None, None
+
+            if age < self.ttl:
+                self._data.move_to_end(key)
+                return value, "fresh"
+            if age < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                return value, "stale"
+
+            del self._data[key]
+            return None, None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = HiscoreCache()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class HiscoreClient:
+    """Shared HTTP client for index_lite.ws.
+
+    Keeps a persistent keep-alive pool, bounds every request with
+    connect/read timeouts, retries transient failures with backoff and
+    coalesces concurrent fetches of the same player into one request.
+    """
+
+    def __init__(self, url=HISCORE_URL, pool_size=POOL_SIZE, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 retries=RETRIES, backoff=BACKOFF):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._inflight = {}  # normalized rsn -> _Call
+        self._lock = threading.Lock()
+
+    def fetch(self, rsn):
+        # Returns the raw index_lite body, NOT_FOUND, or None on upstream error
+        key = normalize_rsn(rsn)
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            return call.result
+
+        try:
+            call.result = self._get(rsn)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def _get(self, rsn):
+        try:
+            response = self.session.get(self.url, params={"player": rsn}, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Hiscore fetch failed for {rsn}: {e}")
+            return None
+
+        if response.status_code == 200:
+            return response.text
+        if response.status_code == 404:
+            return NOT_FOUND
+        print(f"Hiscore fetch for {rsn} returned {response.status_code}")
+        return None
+
+
+client = HiscoreClient()
+
+
+def _fetch(rsn):
+    return client.fetch(rsn)
+
+
+def _store(key, result):
+    if result is not None:
+        _cache.set(key, result)
+
+
+def _refresh(key, rsn):
+    try:
+        _store(key, _fetch(rsn))
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _refresh_in_background(key, rsn):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    threading.Thread(target=_refresh, args=(key, rsn), daemon=True).start()
+
+
+def get_hiscores(rsn):
+    """Return the raw index_lite.ws body for ``rsn``, or None if unavailable.
+
+    Fresh entries are served from cache, stale ones are served while a
+    background refresh runs, and "player not found" is cached briefly.
+    """
+    key = normalize_rsn(rsn)
+    if not key:
+        return None
+
+    value, state = _cache.get(key)
+    if state == "stale":
+        _refresh_in_background(key, rsn)
+    if state is not None:
+        return None if value is NOT_FOUND else value
+
+    result = _fetch(rsn)
+    _store(key, result)
+    return None if result is NOT_FOUND else result
+
+
+def invalidate(rsn):
+    _cache.pop(normalize_rsn(rsn))
+
+
+class Hiscores(NamedTuple):
+    skills: np.ndarray  # (len(SKILLS), 3) int64 rank/level/xp, -1 when unranked
+    activities: np.ndarray  # (len(ACTIVITIES), 2) int64 rank/score, -1 when unranked
+
+    def skill_dict(self):
+        return {
+            skill: {
+                "rank": None if rank < 0 else int(rank),
+                "level": None if level < 0 else int(level),
+                "xp": None if xp < 0 else int(xp),
+            }
+            for skill, (rank, level, xp) in zip(SKILLS, self.skills.tolist())
+        }
+
+    def kill_counts(self):
+        # {activity: score} for every ranked activity/boss
+        return {
+            name: score for name, (_, score) in zip(ACTIVITIES, self.activities.tolist()) if score >= 0
+        }
+
+    def combat_level(self):
+        return combat_level(self.skill_dict())
+
+
+def _parse_lines(text):
+    # Slow path for responses whose shape doesn't match the known layout
+    skills = np.full((len(SKILLS), 3), -1, dtype=np.int64)
+    activities = np.full((len(ACTIVITIES), 2), -1, dtype=np.int64)
+    for i, line in enumerate(text.splitlines()):
+        try:
+            values = [int(v) for v in line.split(",")]
+        except ValueError:
+            continue
+        if i < len(SKILLS) and len(values) == 3:
+            skills[i] = values
+        elif len(SKILLS) <= i < len(SKILLS) + len(ACTIVITIES) and len(values) == 2:
+            activities[i - len(SKILLS)] = values
+    return skills, activities
+
+
+def _split_flat(flat):
+    skills = flat[..., :_SKILL_VALUES].reshape(flat.shape[:-1] + (len(SKILLS), 3))
+    activities = flat[..., _SKILL_VALUES:].reshape(flat.shape[:-1] + (len(ACTIVITIES), 2))
+    return skills, activities
+
+
+def _flatten(text):
+    # "r,l,x\nr,l,x\n..." -> "r,l,x,r,l,x,..." plus how many values it holds
+    flat = text.strip().replace("\n", ",")
+    return flat, flat.count(",") + 1
+
+
+def _parse_flat(flat, count):
+    # One C-level pass over comma separated ints; None if anything was malformed
+    try:
+        with warnings.catch_warnings():
+            # Older NumPy warns (rather than raises) on trailing garbage
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(flat, dtype=np.int64, sep=",")
+    except ValueError:
+        return None
+    return values if values.size == count else None
+
+
+def parse_lite(text):
+    """Decode a full index_lite.ws response (skills, activities, boss KCs)."""
+    flat, count = _flatten(text)
+    if count == _LITE_VALUES:
+        values = _parse_flat(flat, count)
+        if values is not None:
+            return Hiscores(*_split_flat(values))
+    return Hiscores(*_parse_lines(text))
+
+
+def parse_batch(texts):
+    """Parse many responses at once.
+
+    Returns (skills, activities) arrays shaped (n, len(SKILLS), 3) and
+    (n, len(ACTIVITIES), 2). Well-formed responses are converted in a single
+    vectorized pass; anything else falls back to the line-by-line parser.
+    """
+    texts = list(texts)
+    flat = np.full((len(texts), _LITE_VALUES), -1, dtype=np.int64)
+    good, chunks = [], []
+    for i, text in enumerate(texts):
+        chunk, count = _flatten(text)
+        if count == _LITE_VALUES:
+            good.append(i)
+            chunks.append(chunk)
+
+    fallback = sorted(set(range(len(texts))) - set(good))
+    values = _parse_flat(",".join(chunks), len(good) * _LITE_VALUES) if good else None
+    if values is not None:
+        flat[good] = values.reshape(len(good), _LITE_VALUES)
+    else:
+        # A bad token somewhere spoils the joined pass; retry each response on its own
+        for i, chunk in zip(good, chunks):
+            values = _parse_flat(chunk, _LITE_VALUES)
+            if values is None:
+                fallback.append(i)
+            else:
+                flat[i] = values
+
+    skills, activities = _split_flat(flat)
+    for i in fallback:
+        skills[i], activities[i] = _parse_lines(texts[i])
+    return skills, activities
+
+
+def combat_levels(levels):
+    """Vectorized combat level from a (..., len(SKILLS)) array of skill levels.
+
+    Returns floats rounded to 2 places, NaN where a combat skill is missing.
+    """
+    levels = np.asarray(levels)
+    attack, strength, defence, hitpoints, prayer, ranged, magic = (
+        levels[..., i].astype(np.float64) for i in _COMBAT_IDX
+    )
+
+    base = 0.25 * (defence + hitpoints + np.floor_divide(prayer, 2))
+    melee = 0.325 * (attack + strength)
+    range_ = 0.325 * (ranged * 1.5)
+    mage = 0.325 * (magic * 1.5)
+
+    result = np.round(base + np.maximum(melee, np.maximum(range_, mage)), 2)
+    missing = (levels[..., _COMBAT_IDX] < 1).any(axis=-1)
+    return np.where(missing, np.nan, result)
+
+
+def combat_level(stats):
+    # Scalar version for {skill: {"level": ...}} dicts (strings or ints)
+    try:
+        levels = [int(stats[skill]["level"]) for skill in COMBAT_SKILLS]
+    except (KeyError, TypeError, ValueError):
+        return "N/A"
+    if min(levels) < 1:
+        return "N/A"
+
+    attack, strength, defence, hitpoints, prayer, ranged, magic = levels
+    base = 0.25 * (defence + hitpoints + (prayer // 2))
+    melee = 0.325 * (attack + strength)
+    range_ = 0.325 * (ranged * 1.5)
+    mage = 0.325 * (magic * 1.5)
+
+    return round(base + max(melee, range_, mage), 2)
@@ -0,0 +1,280 @@
+# leaderboards.py
+#
+# Clan leaderboards over every linked User. Rankings live in memory as
+# per-metric sorted indexes that are updated incrementally from new snapshots,
+# so top-K and "rank of player X" are O(log n) instead of a sort per request.
+
+import os
+import random
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func
+
+from hiscores import SKILLS, combat_levels
+from models import StatSnapshot, XpGainRollup
+from rollups import period_start
+from snapshot_codec import decode_array, skills_to_rows, unpack_array
+
+REFRESH_INTERVAL = int(os.getenv("LEADERBOARD_REFRESH_INTERVAL", 60))  # seconds
+
+COMBAT = "Combat"
+METRICS = SKILLS + [COMBAT]
+GAIN_METRICS = SKILLS  # combat level has no XP to gain
+
+_MAX_LEVEL = 24  # enough for ~16M entries
+
+
+class _Node:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value, height):
+        # Links only for the levels the node is on; half the nodes have one
+        self.value = value
+        self.next = [None] * height
+        self.width = [1] * height
+
+
+class SortedIndex:
+    """Indexable skip list: ordered insert/remove, rank and positional lookup in O(log n).
+
+    ``width[i]`` is how many positions a level-i link skips; links that run off
+    the end point at a virtual tail one past the last element. The head spans
+    every level, other nodes only their own height, and a level-i search only
+    ever stops on nodes at least i+1 high.
+    """
+
+    def __init__(self):
+        self.head = _Node(None, _MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _find(self, value):
+        # Last node < value on every level, plus each one's position
+        update = [None] * _MAX_LEVEL
+        positions = [0] * _MAX_LEVEL
+        node, pos = self.head, 0
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].value < value:
+                pos += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = pos
+        return update, positions
+
+    def insert(self, value):
+        update, positions = self._find(value)
+        pos = positions[0]
+        height = 1
+        while height < _MAX_LEVEL and random.random() < 0.5:
+            height += 1
+
+        node = _Node(value, height)
+        for level in range(_MAX_LEVEL):
+            prev = update[level]
+            if level < height:
+                node.next[level] = prev.next[level]
+                node.width[level] = positions[level] + prev.width[level] - pos
+                prev.next[level] = node
+                prev.width[level] = pos + 1 - positions[level]
+            else:
+                prev.width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        update, _ = self._find(value)
+        target = update[0].next[0]
+        if target is None or target.value != value:
+            raise KeyError(value)
+        for level in range(_MAX_LEVEL):
+            prev = update[level]
+            if level < len(target.next) and prev.next[level] is target:
+                prev.width[level] += target.width[level] - 1
+                prev.next[level] = target.next[level]
+            else:
+                prev.width[level] -= 1
+        self.size -= 1
+
+    def rank(self, value):
+        # Number of stored values strictly less than ``value``
+        return self._find(value)[1][0]
+
+    def slice(self, start, count):
+        if start >= self.size or count <= 0:
+            return []
+        node, pos = self.head, 0
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and pos + node.width[level] <= start + 1:
+                pos += node.width[level]
+                node = node.next[level]
+
+        values = []
+        while node is not None and len(values) < count:
+            values.append(node.value)
+            node = node.next[0]
+        return values
+
+
+def _sort_key(score):
+    # Higher scores first; tuples compare element-wise (e.g. total level, then xp)
+    if isinstance(score, tuple):
+        return tuple(-s for s in score)
+    return -score
+
+
+class Leaderboard:
+    def __init__(self):
+        self.index = SortedIndex()
+        self.keys = {}  # user_id -> key currently stored in the index
+        self.scores = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def update(self, user_id, score):
+        key = (_sort_key(score), user_id)
+        old = self.keys.get(user_id)
+        if old == key:
+            return
+        if old is not None:
+            self.index.remove(old)
+        self.index.insert(key)
+        self.keys[user_id] = key
+        self.scores[user_id] = score
+
+    def discard(self, user_id):
+        old = self.keys.pop(user_id, None)
+        if old is not None:
+            self.index.remove(old)
+            del self.scores[user_id]
+
+    def top(self, k, offset=0):
+        # [(rank, user_id, score)], ranks are 1-based
+        return [
+            (offset + i + 1, user_id, self.scores[user_id])
+            for i, (_, user_id) in enumerate(self.index.slice(offset, k))
+        ]
+
+    def rank_of(self, user_id):
+        key = self.keys.get(user_id)
+        if key is None:
+            return None
+        return self.index.rank(key) + 1
+
+
+def _stat_rows(snapshot):
+    if snapshot.data is not None:
+        rows = decode_array(snapshot.data)
+    else:
+        rows = np.array(skills_to_rows(snapshot.stats or {}), dtype=np.int64)
+    if rows.shape[1] < len(SKILLS):
+        rows = np.pad(rows, ((0, 0), (0, len(SKILLS) - rows.shape[1])), constant_values=-1)
+    return rows[:, :len(SKILLS)]
+
+
+class LeaderboardEngine:
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.boards = {metric: Leaderboard() for metric in METRICS}
+        self.last_snapshot_id = None
+        self.last_refresh = 0
+        self._gains = {}  # period -> (built_at, {skill: Leaderboard})
+        self._lock = threading.RLock()
+
+    def apply(self, user_ids, stats):
+        """Fold a batch of snapshots into the boards.
+
+        ``stats`` is an (n, 3, len(SKILLS)) rank/level/xp array aligned with
+        ``user_ids``; combat levels for the whole batch are computed at once.
+        """
+        levels = stats[:, 1, :]
+        xps = stats[:, 2, :]
+        ranked = (levels >= 0) & (xps >= 0)
+        combats = combat_levels(levels)
+
+        for j, user_id in enumerate(user_ids):
+            level_row, xp_row, ranked_row = levels[j].tolist(), xps[j].tolist(), ranked[j].tolist()
+            for i, skill in enumerate(SKILLS):
+                if ranked_row[i]:
+                    score = (level_row[i], xp_row[i]) if skill == "Overall" else xp_row[i]
+                    self.boards[skill].update(user_id, score)
+            if not np.isnan(combats[j]):
+                self.boards[COMBAT].update(user_id, float(combats[j]))
+
+    def refresh(self, db, force=False):
+        # Pull snapshots written since the last refresh (throttled)
+        with self._lock:
+            if not force and time.monotonic() - self.last_refresh < self.refresh_interval:
+                return
+            self.last_refresh = time.monotonic()
+
+            query = db.query(StatSnapshot).order_by(StatSnapshot.id)
+            if self.last_snapshot_id is None:
+                # Cold start: only each user's latest snapshot matters
+                latest = db.query(func.max(StatSnapshot.id)).group_by(StatSnapshot.user_id)
+                query = query.filter(StatSnapshot.id.in_(latest.scalar_subquery()))
+            else:
+                query = query.filter(StatSnapshot.id > self.last_snapshot_id)
+
+            user_ids, stats = [], []
+            for snapshot in query.yield_per(500):
+                user_ids.append(snapshot.user_id)
+                stats.append(_stat_rows(snapshot))
+                self.last_snapshot_id = snapshot.id
+                if len(user_ids) >= 500:
+                    self.apply(user_ids, np.stack(stats))
+                    user_ids, stats = [], []
+            if user_ids:
+                self.apply(user_ids, np.stack(stats))
+            if self.last_snapshot_id is None:
+                self.last_snapshot_id = 0
+
+    def query(self, db, metric, period="all", k=25, offset=0, user_id=None):
+        """Return (top rows, rank of ``user_id`` or None, board size).
+
+        ``period="all"`` ranks current stats; "day"/"week"/"month" rank XP
+        gained, rebuilt from the rollups at most once per refresh interval.
+        """
+        with self._lock:
+            if period == "all":
+                self.refresh(db)
+                board = self.boards[metric]
+            else:
+                built_at, boards = self._gains.get(period, (0, None))
+                if boards is None or time.monotonic() - built_at >= self.refresh_interval:
+                    boards = self._build_gains(db, period)
+                    self._gains[period] = (time.monotonic(), boards)
+                board = boards[metric]
+
+            rank = board.rank_of(user_id) if user_id is not None else None
+            return board.top(k, offset), rank, len(board)
+
+    def _build_gains(self, db, period):
+        granularity, since = period_start(period)
+        totals = {}
+        rows = db.query(XpGainRollup.user_id, XpGainRollup.gains).filter(
+            XpGainRollup.granularity == granularity, XpGainRollup.bucket_start >= since
+        )
+        for user_id, blob in rows:
+            gains = unpack_array(blob)
+            total = totals.get(user_id)
+            if total is None:
+                totals[user_id] = np.array(gains)
+            else:
+                width = max(len(total), len(gains))
+                total = np.pad(total, (0, width - len(total)))
+                total[:len(gains)] += gains
+                totals[user_id] = total
+
+        boards = {skill: Leaderboard() for skill in SKILLS}
+        for user_id, total in totals.items():
+            for i, skill in enumerate(SKILLS[:len(total)]):
+                if total[i] > 0:
+                    boards[skill].update(user_id, int(total[i]))
+        return boards
+
+
+clan_leaderboards = LeaderboardEngine()
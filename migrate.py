@@ -0,0 +1,84 @@
+# migrate.py
+#
+# Versioned schema migrations (see migrations/). Applied versions are recorded
+# in the schema_version table.
+#
+#   python migrate.py            # create missing tables, apply pending migrations
+#   python migrate.py --status   # list migrations and whether they are applied
+
+import argparse
+import importlib
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+
+from db import engine
+from models import Base
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def discover():
+    # [(version, module name)] in version order
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME.match(filename)
+        if match:
+            found.append((int(match.group(1)), filename[:-3]))
+    found.sort()
+    versions = [version for version, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return found
+
+
+def applied_versions():
+    schema_version.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def upgrade():
+    # Tables that don't exist yet are created straight from models.py; the
+    # migrations bring existing tables up to date.
+    Base.metadata.create_all(engine)
+    done = applied_versions()
+    pending = [(version, name) for version, name in discover() if version not in done]
+    if not pending:
+        print("Schema is up to date.")
+        return
+
+    for version, name in pending:
+        print(f"Applying {name}...")
+        module = importlib.import_module(f"migrations.{name}")
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(schema_version.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+    print(f"Applied {len(pending)} migration(s).")
+
+
+def status():
+    done = applied_versions()
+    for version, name in discover():
+        print(f"[{'x' if version in done else ' '}] {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    args = parser.parse_args()
+    if args.status:
+        status()
+    else:
+        upgrade()
@@ -0,0 +1,10 @@
+# migrations/0001_queue_description.py (was update_schema.py)
+
+from sqlalchemy import text
+
+from migrations import has_column
+
+
+def upgrade(conn):
+    if not has_column(conn, "queues", "description"):
+        conn.execute(text("ALTER TABLE queues ADD COLUMN description TEXT;"))
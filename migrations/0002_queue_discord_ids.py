@@ -0,0 +1,11 @@
+# migrations/0002_queue_discord_ids.py (was update_schema_bot.py)
+
+from sqlalchemy import text
+
+from migrations import has_column
+
+
+def upgrade(conn):
+    for column in ("discord_message_id", "discord_channel_id"):
+        if not has_column(conn, "queues", column):
+            conn.execute(text(f"ALTER TABLE queues ADD COLUMN {column} TEXT;"))
@@ -0,0 +1,44 @@
+# migrations/0003_snapshot_data.py (was migrate_snapshots.py)
+#
+# Adds snapshots.data and re-encodes legacy JSON rows into it.
+
+import json
+
+from sqlalchemy import text
+
+from migrations import blob_type, has_column
+from snapshot_codec import encode
+
+BATCH_SIZE = 500
+
+
+def upgrade(conn):
+    if not has_column(conn, "snapshots", "data"):
+        conn.execute(text(f"ALTER TABLE snapshots ADD COLUMN data {blob_type(conn)};"))
+        if conn.dialect.name != "postgresql":
+            print("Note: 'stats' keeps its NOT NULL constraint here; recreate local databases with init_db.py.")
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE snapshots ALTER COLUMN stats DROP NOT NULL;"))
+
+    # Backfill in id order; SQLite keeps a JSON "null" in place of SQL NULL for stats
+    converted = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, stats FROM snapshots WHERE id > :last_id AND data IS NULL ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row_id, stats in rows:
+            if isinstance(stats, str):
+                stats = json.loads(stats)
+            if stats:
+                updates.append({"id": row_id, "data": encode(stats)})
+        if updates:
+            stats_value = "NULL" if conn.dialect.name == "postgresql" else "'null'"
+            conn.execute(text(f"UPDATE snapshots SET data = :data, stats = {stats_value} WHERE id = :id"), updates)
+            converted += len(updates)
+        last_id = rows[-1][0]
+    print(f"Converted {converted} snapshots.")
@@ -0,0 +1,19 @@
+# migrations/0004_queue_members_unique.py (was update_schema_queue_members.py)
+
+from sqlalchemy import text
+
+from migrations import has_unique
+
+
+def upgrade(conn):
+    # Drop duplicate memberships left by the old read-check-insert join, keeping the first
+    conn.execute(text(
+        "DELETE FROM queue_members WHERE id NOT IN "
+        "(SELECT MIN(id) FROM queue_members GROUP BY queue_id, discord_id);"
+    ))
+    if has_unique(conn, "queue_members", ["queue_id", "discord_id"]):
+        return  # already created from models.py
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_queue_members_queue_discord "
+        "ON queue_members (queue_id, discord_id);"
+    ))
@@ -0,0 +1,19 @@
+# migrations/0005_hot_path_indexes.py
+#
+# Indexes for the sync tick / expiry, queue listings, stats pages and
+# leaderboards; see check_query_plans.py.
+
+from sqlalchemy import text
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_queues_expires_at ON queues (expires_at);",
+    "CREATE INDEX IF NOT EXISTS ix_queues_created_by ON queues (created_by);",
+    "CREATE INDEX IF NOT EXISTS ix_users_rsn_lower ON users (lower(rsn));",
+    "CREATE INDEX IF NOT EXISTS ix_snapshots_user_id_timestamp ON snapshots (user_id, timestamp);",
+    "CREATE INDEX IF NOT EXISTS ix_xp_gain_rollups_granularity_bucket ON xp_gain_rollups (granularity, bucket_start);",
+]
+
+
+def upgrade(conn):
+    for statement in INDEXES:
+        conn.execute(text(statement))
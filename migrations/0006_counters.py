@@ -0,0 +1,15 @@
+# migrations/0006_counters.py
+#
+# Seeds the "queues" change counter behind the /api/queues ETag. The table
+# itself is created by create_all.
+
+from sqlalchemy import text
+
+from migrations import has_table
+
+
+def upgrade(conn):
+    if not has_table(conn, "counters"):
+        conn.execute(text("CREATE TABLE counters (name VARCHAR PRIMARY KEY, value INTEGER NOT NULL);"))
+    if conn.execute(text("SELECT 1 FROM counters WHERE name = 'queues'")).first() is None:
+        conn.execute(text("INSERT INTO counters (name, value) VALUES ('queues', 0);"))
@@ -0,0 +1,12 @@
+# migrations/0007_queue_version.py
+#
+# Per-queue version for the rendered card cache (see queue_ops.bump_queue).
+
+from sqlalchemy import text
+
+from migrations import has_column
+
+
+def upgrade(conn):
+    if not has_column(conn, "queues", "version"):
+        conn.execute(text("ALTER TABLE queues ADD COLUMN version INTEGER NOT NULL DEFAULT 1;"))
@@ -0,0 +1,29 @@
+# migrations/__init__.py
+#
+# Versioned schema migrations, applied in order by migrate.py. Each module is
+# named NNNN_description.py and defines upgrade(conn), which runs inside the
+# migration's transaction. Migrations check before altering so they are safe
+# on databases that were created or patched by hand before the runner existed.
+
+from sqlalchemy import inspect
+
+
+def has_column(conn, table, column):
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def has_table(conn, table):
+    return inspect(conn).has_table(table)
+
+
+def has_unique(conn, table, columns):
+    # True if a unique constraint or unique index already covers exactly ``columns``
+    inspector = inspect(conn)
+    columns = list(columns)
+    return any(c["column_names"] == columns for c in inspector.get_unique_constraints(table)) or any(
+        i["unique"] and i["column_names"] == columns for i in inspector.get_indexes(table)
+    )
+
+
+def blob_type(conn):
+    return "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
@@ -1,8 +1,9 @@
 # models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, LargeBinary, UniqueConstraint, Index, func
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
+from snapshot_codec import decode, kill_counts
 
 Base = declarative_base()
 
@@ -16,17 +17,48 @@ class User(Base):
     linked_at = Column(DateTime, default=datetime.utcnow)
 
     snapshots = relationship("StatSnapshot", back_populates="user")
+    xp_gains = relationship("XpGainRollup", back_populates="user")
+
+# /stats?rsn= looks players up case-insensitively
+Index("ix_users_rsn_lower", func.lower(User.rsn))
 
 class StatSnapshot(Base):
     __tablename__ = "snapshots"
+    __table_args__ = (Index("ix_snapshots_user_id_timestamp", "user_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    stats = Column(JSON, nullable=False)
+    stats = Column(JSON, nullable=True)  # legacy free-form rows, see migrations/0003_snapshot_data.py
+    data = Column(LargeBinary, nullable=True)  # packed arrays, see snapshot_codec.py
 
     user = relationship("User", back_populates="snapshots")
 
+    @property
+    def skills(self):
+        if self.data is not None:
+            return decode(self.data)
+        return self.stats
+
+    @property
+    def kill_counts(self):
+        return kill_counts(self.data) if self.data is not None else {}
+
+class XpGainRollup(Base):
+    __tablename__ = "xp_gain_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "granularity", "bucket_start"),
+        Index("ix_xp_gain_rollups_granularity_bucket", "granularity", "bucket_start"),  # leaderboards
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    granularity = Column(String, nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    gains = Column(LargeBinary, nullable=False)  # packed per-skill XP, see rollups.py
+
+    user = relationship("User", back_populates="xp_gains")
+
 # --- Queue System ---
 class Queue(Base):
     __tablename__ = "queues"
@@ -35,17 +67,19 @@ class Queue(Base):
     boss = Column(String, nullable=False)  # Boss/Raid/Event name
     role = Column(String, nullable=False)  # learner/teacher/etc.
     group_size = Column(Integer, nullable=False)  # 2–100
-    expires_at = Column(DateTime, nullable=False)
-    created_by = Column(String, nullable=False)  # Discord ID
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_by = Column(String, nullable=False, index=True)  # Discord ID
     created_at = Column(DateTime, default=datetime.utcnow)
     description = Column(String, nullable=True)  # Notes
     discord_message_id = Column(String, nullable=True)
     discord_channel_id = Column(String, nullable=True)
+    version = Column(Integer, nullable=False, default=1)  # bumped on every change to the card, see queue_ops.bump_queue
 
-    members = relationship("QueueMember", back_populates="queue", cascade="all, delete")
+    members = relationship("QueueMember", back_populates="queue", cascade="all, delete", order_by="QueueMember.id")
 
 class QueueMember(Base):
     __tablename__ = "queue_members"
+    __table_args__ = (UniqueConstraint("queue_id", "discord_id", name="uq_queue_members_queue_discord"),)
 
     id = Column(Integer, primary_key=True)
     queue_id = Column(Integer, ForeignKey("queues.id"), nullable=False)
@@ -55,6 +89,13 @@ class QueueMember(Base):
 
     queue = relationship("Queue", back_populates="members")
 
+class Counter(Base):
+    # Monotonic change counters, e.g. "queues" (see queue_ops.bump_queues_version)
+    __tablename__ = "counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
 class Notification(Base):
     __tablename__ = "notifications"
 
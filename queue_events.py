@@ -0,0 +1,122 @@
+# queue_events.py
+#
+# Change notifications for queues, shared by the web app and the bot.
+#
+# Production (Postgres) uses LISTEN/NOTIFY on CHANNEL. Other databases (local
+# SQLite) fall back to UDP datagrams on the loopback interface: each listener
+# binds one of a small range of ports and publishers send to all of them.
+
+import json
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+
+from sqlalchemy import text
+
+from db import engine
+
+CHANNEL = "queue_events"
+EVENTS = ("create", "join", "leave", "kick", "close", "expire")
+
+LOOPBACK_HOST = "127.0.0.1"
+LOOPBACK_PORT = int(os.getenv("QUEUE_EVENTS_PORT", 47600))
+LOOPBACK_SLOTS = int(os.getenv("QUEUE_EVENTS_SLOTS", 8))  # max local listener processes
+
+# Tags every event this process publishes, so a listener can skip its own echoes
+ORIGIN = uuid.uuid4().hex
+
+
+def use_postgres():
+    return engine.dialect.name == "postgresql"
+
+
+def publish(event, queue_id, **extra):
+    # Fire-and-forget; a lost notification is caught by the reconciliation poll
+    payload = json.dumps({"event": event, "queue_id": queue_id, "origin": ORIGIN, **extra})
+    try:
+        if use_postgres():
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                for port in range(LOOPBACK_PORT, LOOPBACK_PORT + LOOPBACK_SLOTS):
+                    try:
+                        sock.sendto(payload.encode(), (LOOPBACK_HOST, port))
+                    except OSError:
+                        pass
+            finally:
+                sock.close()
+    except Exception as e:
+        print(f"[Events] Publish failed ({event} {queue_id}): {e}")
+
+
+def _listen_postgres(callback, stop):
+    while not stop.is_set():
+        try:
+            # Dedicated connection, detached from the pool for the listener's lifetime
+            raw = engine.raw_connection()
+            raw.detach()
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL};")
+            print(f"[Events] Listening on Postgres channel '{CHANNEL}'")
+
+            while not stop.is_set():
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        callback(json.loads(notify.payload))
+                    except Exception as e:
+                        print(f"[Events] Bad event: {e}")
+        except Exception as e:
+            print(f"[Events] Listener error, reconnecting: {e}")
+            time.sleep(2)
+
+
+def _listen_loopback(callback, stop):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for port in range(LOOPBACK_PORT, LOOPBACK_PORT + LOOPBACK_SLOTS):
+        try:
+            sock.bind((LOOPBACK_HOST, port))
+            break
+        except OSError:
+            continue
+    else:
+        print("[Events] No free loopback slot; relying on polling only")
+        return
+    print(f"[Events] Listening on {LOOPBACK_HOST}:{port}")
+
+    sock.settimeout(1)
+    while not stop.is_set():
+        try:
+            data, _ = sock.recvfrom(65535)
+        except socket.timeout:
+            continue
+        try:
+            callback(json.loads(data))
+        except Exception as e:
+            print(f"[Events] Bad event: {e}")
+
+
+def is_own(event):
+    # True for an event published by this process
+    return event.get("origin") == ORIGIN
+
+
+def listen(callback):
+    """Call ``callback(event_dict)`` from a daemon thread for every queue event.
+
+    Returns a threading.Event that stops the listener when set.
+    """
+    stop = threading.Event()
+    target = _listen_postgres if use_postgres() else _listen_loopback
+    threading.Thread(target=target, args=(callback, stop), daemon=True, name="queue-events").start()
+    return stop
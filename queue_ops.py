@@ -0,0 +1,127 @@
+# queue_ops.py
+#
+# Queue membership changes shared by the web app and the bot. Joins are a
+# single conditional INSERT under a row lock on the queue, so bursts of joins
+# can't overfill a queue, and the unique (queue_id, discord_id) constraint
+# rejects duplicates.
+#
+# Every change to the set of active queues or their members also bumps the
+# "queues" counter in the same transaction; /api/queues builds its ETag from it.
+# Changes to one queue's card (members, host RSN) bump that queue's version,
+# which keys the rendered card cache in routes/queue.py.
+
+import enum
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import Counter, Queue, QueueMember
+
+QUEUES_VERSION = "queues"
+
+
+class JoinResult(enum.Enum):
+    JOINED = "joined"
+    FULL = "full"
+    DUPLICATE = "duplicate"
+    EXPIRED = "expired"
+    NOT_FOUND = "not_found"
+
+
+class JoinOutcome(NamedTuple):
+    result: JoinResult
+    boss: Optional[str] = None
+
+
+def join_queue(db, queue_id, discord_id, rsn):
+    """Add ``discord_id`` to the queue if it is open and has room; commits.
+
+    Two statements: lock the queue row (SELECT ... FOR UPDATE on Postgres; a
+    no-op on SQLite, where the INSERT below runs under the database write lock
+    anyway), then insert only if the member count is still below group_size.
+    When nothing was inserted, a third tells a member re-joining a full queue
+    (DUPLICATE) apart from a newcomer (FULL).
+    """
+    now = datetime.utcnow()
+    try:
+        queue = db.execute(
+            select(Queue.id, Queue.boss, Queue.expires_at).where(Queue.id == queue_id).with_for_update()
+        ).first()
+        if queue is None:
+            db.rollback()
+            return JoinOutcome(JoinResult.NOT_FOUND)
+        if queue.expires_at <= now:
+            db.rollback()
+            return JoinOutcome(JoinResult.EXPIRED, queue.boss)
+
+        member_count = (
+            select(func.count(QueueMember.id)).where(QueueMember.queue_id == Queue.id).scalar_subquery()
+        )
+        inserted = db.execute(
+            insert(QueueMember).from_select(
+                ["queue_id", "discord_id", "rsn", "joined_at"],
+                select(Queue.id, literal(discord_id), literal(rsn), literal(now)).where(
+                    Queue.id == queue_id, Queue.expires_at > now, member_count < Queue.group_size
+                ),
+            )
+        )
+        if inserted.rowcount == 0:
+            # The fullness check runs before the unique constraint could fire
+            member = db.execute(
+                select(QueueMember.id).where(QueueMember.queue_id == queue_id, QueueMember.discord_id == discord_id)
+            ).first()
+            db.rollback()
+            return JoinOutcome(JoinResult.DUPLICATE if member else JoinResult.FULL, queue.boss)
+        bump_queue(db, queue_id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return JoinOutcome(JoinResult.DUPLICATE, queue.boss)
+
+    return JoinOutcome(JoinResult.JOINED, queue.boss)
+
+
+def remove_member(db, queue_id, discord_id):
+    # One DELETE; returns True if the member was in the queue. Commits.
+    deleted = db.execute(
+        delete(QueueMember).where(QueueMember.queue_id == queue_id, QueueMember.discord_id == discord_id)
+    )
+    if deleted.rowcount:
+        bump_queue(db, queue_id)
+    db.commit()
+    return deleted.rowcount > 0
+
+
+def bump_queues_version(db):
+    # Call just before the commit that makes the change: on Postgres the counter
+    # row stays locked until then, so concurrent queue writes serialize on it.
+    bumped = db.execute(
+        update(Counter).where(Counter.name == QUEUES_VERSION).values(value=Counter.value + 1)
+    )
+    if not bumped.rowcount:
+        # Not seeded yet (database made by create_all without migrate.py)
+        db.add(Counter(name=QUEUES_VERSION, value=1))
+
+
+def bump_queue(db, queue_id):
+    db.execute(update(Queue).where(Queue.id == queue_id).values(version=Queue.version + 1))
+    bump_queues_version(db)
+
+
+def bump_hosted_queues(db, discord_id):
+    # The host's RSN is shown on their queues' cards
+    bumped = db.execute(update(Queue).where(Queue.created_by == discord_id).values(version=Queue.version + 1))
+    if bumped.rowcount:
+        bump_queues_version(db)
+
+
+def queues_version(db, now):
+    # (counter, next expiry) in one round trip: a primary key lookup plus an
+    # index seek on queues.expires_at. The next expiry changes the listing
+    # without any write, because expired queues drop out of it by time.
+    counter = select(Counter.value).where(Counter.name == QUEUES_VERSION).scalar_subquery()
+    next_expiry = select(func.min(Queue.expires_at)).where(Queue.expires_at > now).scalar_subquery()
+    row = db.execute(select(counter, next_expiry)).one()
+    return row[0] or 0, row[1]
@@ -0,0 +1,88 @@
+# queue_stream.py
+#
+# Fans queue_events out to the Server-Sent Events clients of /queue/stream.
+# Each web process runs one queue_events listener, started on the first
+# subscription. It builds each delta once and hands the same encoded message
+# to every connected browser. Clients hold no database connection while they
+# wait.
+#
+# Under the gevent worker (gunicorn.conf.py) threading and queue are
+# monkey-patched, so each idle client costs a parked greenlet rather than a
+# worker.
+
+import json
+import queue
+import threading
+
+import queue_events
+
+HEARTBEAT = 15  # seconds; keeps proxies (Heroku closes at 55s idle) from dropping quiet streams
+MAX_PENDING = 100  # messages buffered per client before it is dropped as too slow
+RETRY_MS = 5000  # browser reconnect delay
+
+
+class Subscriber:
+    def __init__(self):
+        self.messages = queue.Queue(maxsize=MAX_PENDING)
+        self.dropped = False
+
+
+def encode(data):
+    return f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class QueueStream:
+    def __init__(self, build_delta):
+        # build_delta(event_dict) -> JSON-able delta, called once per event
+        self.build_delta = build_delta
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listener = None
+        self.stats = {"events": 0, "sent": 0, "dropped": 0}
+
+    def subscribe(self):
+        subscriber = Subscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._listener is None:
+                self._listener = queue_events.listen(self._on_event)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def clients(self):
+        return len(self._subscribers)
+
+    def _on_event(self, event):
+        # Runs on the listener thread / greenlet
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        self.stats["events"] += 1
+        message = encode(self.build_delta(event))
+        for subscriber in subscribers:
+            try:
+                subscriber.messages.put_nowait(message)
+                self.stats["sent"] += 1
+            except queue.Full:
+                # Too far behind: cut it loose. The browser reconnects and resyncs.
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+                self.stats["dropped"] += 1
+
+    def stream(self, subscriber):
+        # Generator for a streaming response; unsubscribes when the client goes away
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                try:
+                    yield subscriber.messages.get(timeout=HEARTBEAT)
+                except queue.Empty:
+                    if subscriber.dropped:
+                        return
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(subscriber)
@@ -0,0 +1,139 @@
+# rollups.py
+#
+# Per-user hourly and daily XP gain aggregates, maintained incrementally as
+# snapshots are written so that "gains over a period" never scans raw history.
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from hiscore_layout import SKILLS
+from models import StatSnapshot, XpGainRollup
+from snapshot_codec import decode_array, skills_to_rows, pack_array, unpack_array
+
+GRANULARITIES = ("hour", "day")
+
+# period -> (rollup granularity, number of buckets including the current one)
+PERIODS = {
+    "day": ("hour", 24),
+    "week": ("day", 7),
+    "month": ("day", 30),
+}
+
+
+def bucket_start(ts, granularity):
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _step(granularity):
+    return timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+
+
+def _xp_vector(data=None, stats=None):
+    if data is not None:
+        return np.asarray(decode_array(data)[2])
+    return np.asarray(skills_to_rows(stats)[2], dtype=np.int64)
+
+
+def _add(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    out = a.copy()
+    out[:len(b)] += b
+    return out
+
+
+def latest_xp(db, user_ids):
+    """{user_id: xp vector} for each user's most recent stored snapshot."""
+    if not user_ids:
+        return {}
+    latest_ids = (
+        db.query(func.max(StatSnapshot.id))
+        .filter(StatSnapshot.user_id.in_(user_ids))
+        .group_by(StatSnapshot.user_id)
+    )
+    rows = (
+        db.query(StatSnapshot.user_id, StatSnapshot.data, StatSnapshot.stats)
+        .filter(StatSnapshot.id.in_(latest_ids.scalar_subquery()))
+        .all()
+    )
+    return {r.user_id: _xp_vector(r.data, r.stats) for r in rows}
+
+
+def apply_snapshots(db, rows, previous):
+    """Fold freshly inserted snapshot rows into the rollup tables.
+
+    ``rows`` are the dicts passed to the snapshot INSERT (user_id, timestamp,
+    data) and ``previous`` comes from latest_xp() taken *before* the insert.
+    It is updated in place so consecutive batches chain correctly.
+    """
+    pending = {}
+    for row in sorted(rows, key=lambda r: r["timestamp"]):
+        current = _xp_vector(row["data"])
+        prev = previous.get(row["user_id"])
+        previous[row["user_id"]] = current
+        if prev is None:
+            continue
+
+        if len(prev) < len(current):
+            # Skills added since the last snapshot start with no gain
+            prev = np.concatenate([prev, current[len(prev):]])
+        prev = prev[:len(current)]
+        # -1 is "unranked", not 0 XP: a skill's first ranked total is not a gain
+        ranked = (prev >= 0) & (current >= 0)
+        gains = np.where(ranked, np.clip(current - prev, 0, None), 0)
+        if not gains.any():
+            continue
+
+        for granularity in GRANULARITIES:
+            key = (row["user_id"], granularity, bucket_start(row["timestamp"], granularity))
+            pending[key] = _add(pending[key], gains) if key in pending else gains
+
+    if not pending:
+        return 0
+
+    user_ids = {k[0] for k in pending}
+    buckets = {k[2] for k in pending}
+    existing = {
+        (r.user_id, r.granularity, r.bucket_start): r
+        for r in db.query(XpGainRollup).filter(
+            XpGainRollup.user_id.in_(user_ids), XpGainRollup.bucket_start.in_(buckets)
+        )
+    }
+
+    for key, gains in pending.items():
+        rollup = existing.get(key)
+        if rollup:
+            rollup.gains = pack_array(_add(unpack_array(rollup.gains), gains))
+        else:
+            user_id, granularity, start = key
+            db.add(XpGainRollup(
+                user_id=user_id, granularity=granularity, bucket_start=start, gains=pack_array(gains)
+            ))
+    return len(pending)
+
+
+def period_start(period, now=None):
+    # (granularity, first bucket_start) of the rollups covering ``period``
+    granularity, buckets = PERIODS[period]
+    now = now or datetime.utcnow()
+    return granularity, bucket_start(now, granularity) - _step(granularity) * (buckets - 1)
+
+
+def gains_for_period(db, user_id, period, now=None):
+    """Sum the rollup buckets covering ``period``; returns (since, {skill: xp})."""
+    granularity, since = period_start(period, now)
+
+    total = np.zeros(len(SKILLS), dtype=np.int64)
+    rows = db.query(XpGainRollup.gains).filter(
+        XpGainRollup.user_id == user_id,
+        XpGainRollup.granularity == granularity,
+        XpGainRollup.bucket_start >= since,
+    )
+    for (blob,) in rows:
+        total = _add(total, unpack_array(blob))
+
+    return since, {skill: int(total[i]) for i, skill in enumerate(SKILLS[:len(total)])}
@@ -1,21 +1,124 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
-from db import SessionLocal
+from flask import Blueprint, render_template, request, redirect, url_for, g, jsonify
+from web_db import get_db
+from db import session_scope
+from queue_stream import QueueStream
+from fragment_cache import FragmentCache
 from models import Queue, User, QueueMember
 from datetime import datetime, timedelta
 from auth import requires_login
-from flask import flash
+from queue_events import publish
+from queue_ops import JoinResult, join_queue as join_queue_atomic, remove_member, bump_queue, bump_queues_version, queues_version
+from flask import flash, current_app, Response
+from markupsafe import Markup
 from sqlalchemy import desc
 from sqlalchemy.orm import joinedload
 import json
+import os
 import traceback
 
 bp = Blueprint("queue", __name__)
 
+JOIN_MESSAGES = {
+    JoinResult.JOINED: ("success", "Joined queue!"),
+    JoinResult.FULL: ("error", "Queue is full."),
+    JoinResult.DUPLICATE: ("info", "You are already in this queue."),
+    JoinResult.EXPIRED: ("error", "Queue expired."),
+    JoinResult.NOT_FOUND: ("error", "Queue not found."),
+}
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+# Rendered cards, keyed (queue id, version, is_host, is_member); see templates/queue/_card.html
+card_cache = FragmentCache(int(os.getenv("QUEUE_CARD_CACHE_SIZE", 2000)))
+EXPIRES_IN = "__expires_in__"  # placeholder swapped for the minutes left on each view
+
+def active_queues(db, now_time):
+    return db.query(Queue).options(joinedload(Queue.members)).filter(Queue.expires_at > now_time)
+
+def queue_dicts(db, queues):
+    # Fetch RSNs for queue creators
+    creator_ids = [q.created_by for q in queues]
+    creators = db.query(User).filter(User.discord_id.in_(creator_ids)).all()
+    creator_map = {u.discord_id: u.rsn for u in creators}
+
+    queue_data = []
+    for q in queues:
+        queue_data.append({
+            "id": q.id,
+            "boss": q.boss,
+            "role": q.role,
+            "group_size": q.group_size,
+            "expires_at": q.expires_at,
+            "description": q.description,
+            "created_by": q.created_by,
+            "version": q.version,
+            "members": [{"rsn": m.rsn, "discord_id": m.discord_id} for m in q.members],
+            "host_rsn": creator_map.get(q.created_by, "Unknown")
+        })
+    return queue_data
+
+def queue_delta(event):
+    # What /queue/stream sends for one queue_events notification: the queue as
+    # /api/queues would list it, or null once it is gone
+    queue_id = event.get("queue_id")
+    data = None
+    if event.get("event") not in ("close", "expire"):
+        with session_scope() as db:
+            queues = active_queues(db, datetime.utcnow()).filter(Queue.id == queue_id).all()
+            if queues:
+                data = api_dict(queue_dicts(db, queues)[0])
+    return {"event": event.get("event"), "queue_id": queue_id, "queue": data}
+
+stream = QueueStream(queue_delta)
+
+def api_dict(queue):
+    queue["expires_at"] = queue["expires_at"].isoformat() + "Z"
+    return queue
+
+def render_cards(db, now_time, user_id):
+    # Cards for every active queue, newest first. Reads queue ids/versions and the
+    # viewer's memberships; members and hosts are only loaded for cache misses.
+    rows = (
+        db.query(Queue.id, Queue.version, Queue.created_by, Queue.expires_at)
+        .filter(Queue.expires_at > now_time).order_by(Queue.created_at.desc()).all()
+    )
+    if not rows:
+        return []
+    member_of = {
+        queue_id for (queue_id,) in
+        db.query(QueueMember.queue_id).filter(QueueMember.discord_id == user_id, QueueMember.queue_id.in_([r.id for r in rows]))
+    }
+    keys = [(r.id, r.version, r.created_by == user_id, r.id in member_of) for r in rows]
+    cards = {key: card_cache.get(key) for key in keys}
+
+    missing = [key for key, card in cards.items() if card is None]
+    if missing:
+        queues = active_queues(db, now_time).filter(Queue.id.in_({key[0] for key in missing})).all()
+        by_id = {q["id"]: q for q in queue_dicts(db, queues)}
+        for key in missing:
+            queue = by_id.get(key[0])
+            if queue is None:
+                continue  # gone since the first query
+            card = render_template("queue/_card.html", queue=queue, is_host=key[2], is_member=key[3], expires_in=EXPIRES_IN)
+            # Cache under the version actually rendered, in case it moved on meanwhile
+            card_cache.set((queue["id"], queue["version"]) + key[2:], card)
+            cards[key] = card
+
+    return [
+        Markup(cards[key].replace(EXPIRES_IN, str((row.expires_at - now_time).seconds // 60)))
+        for key, row in zip(keys, rows) if cards[key] is not None
+    ]
+
+def listing_etag(db, now_time):
+    # Strong ETag for everything /api/queues can return right now; see queue_ops.queues_version
+    version, next_expiry = queues_version(db, now_time)
+    return f"q{version}-{next_expiry.strftime('%Y%m%d%H%M%S%f') if next_expiry else 'none'}"
+
 @bp.route("/queue/create", methods=["GET", "POST"])
 @requires_login
 def create_queue():
-    discord = current_app.discord
-    user = discord.fetch_user()
+    user = g.user
 
     RAIDS = sorted(["ToA", "ToB", "CoX"])
     BOSSES = sorted([
@@ -35,33 +138,32 @@ def create_queue():
         notes = request.form.get("notes", "")
         flash("Queue created successfully!")
 
-        db = SessionLocal()
-        try:
-            creator = db.query(User).filter_by(discord_id=str(user.id)).first()
-            if not creator:
-                return redirect(url_for("link_rsn"))
-
-            queue = Queue(
-                boss=activity,
-                role=role,
-                group_size=max(2, min(group_size, 100)),
-                created_by=str(user.id),
-                description=notes,
-                expires_at=datetime.utcnow() + timedelta(minutes=expires_in)
-            )
-            db.add(queue)
-            db.commit() # Commit first
-
-            # Add creator as member
-            member = QueueMember(
-                queue_id=queue.id,
-                discord_id=str(user.id),
-                rsn=creator.rsn
-            )
-            db.add(member)
-            db.commit()
-        finally:
-            db.close()
+        db = get_db()
+        creator = db.query(User).filter_by(discord_id=str(user.id)).first()
+        if not creator:
+            return redirect(url_for("link_rsn"))
+
+        queue = Queue(
+            boss=activity,
+            role=role,
+            group_size=max(2, min(group_size, 100)),
+            created_by=str(user.id),
+            description=notes,
+            expires_at=datetime.utcnow() + timedelta(minutes=expires_in)
+        )
+        db.add(queue)
+        db.flush() # Get the queue id
+
+        # Add creator as member
+        member = QueueMember(
+            queue_id=queue.id,
+            discord_id=str(user.id),
+            rsn=creator.rsn
+        )
+        db.add(member)
+        bump_queues_version(db)
+        db.commit()
+        publish("create", queue.id)
 
         return redirect(url_for("queue.list_queues"))
 
@@ -75,134 +177,122 @@ def create_queue():
 @bp.route("/queue/active")
 @requires_login
 def list_queues():
-    discord = current_app.discord
-    user = discord.fetch_user()
-    db = SessionLocal()
-
+    user = g.user
+    db = get_db()
     try:
         now_time = datetime.utcnow()
-        queues = db.query(Queue).options(joinedload(Queue.members)).filter(Queue.expires_at > now_time).order_by(Queue.created_at.desc()).all()
-
-        # Fetch RSNs for queue creators
-        creator_ids = [q.created_by for q in queues]
-        creators = db.query(User).filter(User.discord_id.in_(creator_ids)).all()
-        creator_map = {u.discord_id: u.rsn for u in creators}
-
-        queue_data = []
-        for q in queues:
-            queue_data.append({
-                "id": q.id,
-                "boss": q.boss,
-                "role": q.role,
-                "group_size": q.group_size,
-                "expires_at": q.expires_at,
-                "description": q.description,
-                "members": [{"rsn": m.rsn, "discord_id": m.discord_id} for m in q.members],
-                "host_rsn": creator_map.get(q.created_by, "Unknown")
-            })
-
-        return render_template("queue/active.html", queues=queue_data, current_user_id=str(user.id))
+        etag = listing_etag(db, now_time)
+        cards = render_cards(db, now_time, str(user.id))
+
+        return render_template("queue/active.html", cards=cards, current_user_id=str(user.id), etag=etag)
 
     except Exception as e:
         print("CRITICAL ERROR IN LIST_QUEUES:")
         traceback.print_exc()
         return f"CRITICAL ERROR: {str(e)} <br><pre>{traceback.format_exc()}</pre>", 500
-    finally:
-        db.close()
+
+@bp.route("/api/queues")
+@requires_login
+def api_queues():
+    # Newest first; ?cursor=<next_cursor> pages on, ?boss= / ?role= filter
+    db = get_db()
+    now_time = datetime.utcnow()
+    etag = listing_etag(db, now_time)
+    if etag in request.if_none_match:
+        # Nothing changed since the client's copy: no queue or member rows read
+        response = current_app.response_class(status=304)
+    else:
+        try:
+            limit = min(max(int(request.args.get("limit", API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+            cursor = request.args.get("cursor", type=int)
+        except ValueError:
+            return jsonify(error="limit must be a number"), 400
+
+        query = active_queues(db, now_time)
+        if cursor:
+            query = query.filter(Queue.id < cursor)
+        if request.args.get("boss"):
+            query = query.filter(Queue.boss == request.args["boss"])
+        if request.args.get("role"):
+            query = query.filter(Queue.role == request.args["role"])
+        queues = query.order_by(Queue.id.desc()).limit(limit + 1).all()
+
+        page = [api_dict(q) for q in queue_dicts(db, queues[:limit])]
+        response = jsonify(queues=page, next_cursor=page[-1]["id"] if len(queues) > limit else None)
+
+    response.set_etag(etag)
+    # Always revalidate; a repeat poll costs one small query and an empty 304
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@bp.route("/queue/stream")
+@requires_login
+def queue_stream():
+    # Server-Sent Events: one "data:" line per queue change, see queue_stream.py
+    response = Response(stream.stream(stream.subscribe()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return response
 
 @bp.route("/queue/join/<int:queue_id>")
 @requires_login
 def join_queue(queue_id):
-    user = current_app.discord.fetch_user()
-    db = SessionLocal()
-    try:
-        queue = db.query(Queue).filter_by(id=queue_id).first()
-        rsn_user = db.query(User).filter_by(discord_id=str(user.id)).first()
-        
-        if not queue:
-            flash("Queue not found.", "error")
-            return redirect(url_for("queue.list_queues"))
-            
-        if queue.expires_at < datetime.utcnow():
-            flash("Queue expired.", "error")
-            return redirect(url_for("queue.list_queues"))
-            
-        if not rsn_user:
-             flash("Please link your RSN first.", "error")
-             return redirect(url_for("link_rsn"))
-
-        # Check if already joined
-        existing = db.query(QueueMember).filter_by(queue_id=queue.id, discord_id=str(user.id)).first()
-        if existing:
-            flash("You are already in this queue.", "info")
-            return redirect(url_for("queue.list_queues"))
-            
-        # Check if full
-        if len(queue.members) >= queue.group_size:
-            flash("Queue is full.", "error")
-            return redirect(url_for("queue.list_queues"))
-            
-        # Join
-        member = QueueMember(
-            queue_id=queue.id,
-            discord_id=str(user.id),
-            rsn=rsn_user.rsn
-        )
-        db.add(member)
-        db.commit()
-        flash("Joined queue!", "success")
-    finally:
-        db.close()
+    user = g.user
+    db = get_db()
+    rsn_user = db.query(User).filter_by(discord_id=str(user.id)).first()
+    if not rsn_user:
+         flash("Please link your RSN first.", "error")
+         return redirect(url_for("link_rsn"))
+
+    outcome = join_queue_atomic(db, queue_id, str(user.id), rsn_user.rsn)
+    if outcome.result is JoinResult.JOINED:
+        publish("join", queue_id)
+    category, message = JOIN_MESSAGES[outcome.result]
+    flash(message, category)
     
     return redirect(url_for("queue.list_queues"))
 
 @bp.route("/queue/leave/<int:queue_id>")
 @requires_login
 def leave_queue(queue_id):
-    user = current_app.discord.fetch_user()
-    db = SessionLocal()
-    try:
-        member = db.query(QueueMember).filter_by(queue_id=queue_id, discord_id=str(user.id)).first()
-        if member:
-            db.delete(member)
-            db.commit()
-            flash("Left queue.", "success")
-        else:
-             flash("You are not in this queue.", "error")
-    finally:
-        db.close()
+    user = g.user
+    db = get_db()
+    if remove_member(db, queue_id, str(user.id)):
+        publish("leave", queue_id)
+        flash("Left queue.", "success")
+    else:
+         flash("You are not in this queue.", "error")
         
     return redirect(url_for("queue.list_queues"))
 
 @bp.route("/queue/kick/<int:queue_id>/<string:target_discord_id>")
 @requires_login
 def kick_member(queue_id, target_discord_id):
-    user = current_app.discord.fetch_user()
-    db = SessionLocal()
-    try:
-        queue = db.query(Queue).filter_by(id=queue_id).first()
-        if not queue:
-            flash("Queue not found.", "error")
-            return redirect(url_for("queue.list_queues"))
-        
-        # Security Check: Only the host can kick
-        if queue.created_by != str(user.id):
-            flash("Only the host can kick members.", "error")
-            return redirect(url_for("queue.list_queues"))
-
-        # Cannot kick self
-        if target_discord_id == str(user.id):
-            flash("You cannot kick yourself.", "error")
-            return redirect(url_for("queue.list_queues"))
-
-        member = db.query(QueueMember).filter_by(queue_id=queue_id, discord_id=target_discord_id).first()
-        if member:
-            db.delete(member)
-            db.commit()
-            flash(f"Kicked {member.rsn} from the queue.", "success")
-        else:
-            flash("User not found in queue.", "error")
-    finally:
-        db.close()
+    user = g.user
+    db = get_db()
+    queue = db.query(Queue).filter_by(id=queue_id).first()
+    if not queue:
+        flash("Queue not found.", "error")
+        return redirect(url_for("queue.list_queues"))
+    
+    # Security Check: Only the host can kick
+    if queue.created_by != str(user.id):
+        flash("Only the host can kick members.", "error")
+        return redirect(url_for("queue.list_queues"))
+
+    # Cannot kick self
+    if target_discord_id == str(user.id):
+        flash("You cannot kick yourself.", "error")
+        return redirect(url_for("queue.list_queues"))
+
+    member = db.query(QueueMember).filter_by(queue_id=queue_id, discord_id=target_discord_id).first()
+    if member:
+        db.delete(member)
+        bump_queue(db, queue_id)
+        db.commit()
+        publish("kick", queue_id)
+        flash(f"Kicked {member.rsn} from the queue.", "success")
+    else:
+        flash("User not found in queue.", "error")
         
     return redirect(url_for("queue.list_queues"))
\ No newline at end of file
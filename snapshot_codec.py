@@ -0,0 +1,139 @@
+# snapshot_codec.py
+#
+# Compact binary format for StatSnapshot rows.
+#
+#   header:  version (u8) | flags (u8) | skill count (u16) | activity count (u16)
+#   payload: zlib( rank[n] | level[n] | xp[n] | act_rank[m] | act_score[m] )
+#            as little-endian int64
+#
+# Skills and activities are stored in hiscore_layout.SKILLS / ACTIVITIES order, so
+# names are never repeated. Missing values use the hiscores' own "-1"
+# sentinel. Every blob is self-contained, so any row can be read on its own.
+# The flags byte is reserved and always 0. Version 1 blobs (skills only) are
+# still readable.
+
+import struct
+import zlib
+
+import numpy as np
+
+from hiscore_layout import SKILLS, ACTIVITIES
+
+FORMAT_VERSION = 2
+
+_HEADERS = {1: struct.Struct("<BBH"), 2: struct.Struct("<BBHH")}
+_FIELDS = ("rank", "level", "xp")
+
+
+def _to_le_bytes(values):
+    return np.asarray(values, dtype="<i8").tobytes()
+
+
+def skills_to_rows(skills):
+    # {skill: {"rank", "level", "xp"}} -> [ranks, levels, xps] in SKILLS order
+    rows = []
+    for field in _FIELDS:
+        row = []
+        for skill in SKILLS:
+            try:
+                row.append(int((skills.get(skill) or {}).get(field)))
+            except (TypeError, ValueError):
+                row.append(-1)
+        rows.append(row)
+    return rows
+
+
+def rows_to_skills(rows):
+    skills = {}
+    for i, skill in enumerate(SKILLS[:len(rows[0])]):
+        skills[skill] = {
+            field: (None if rows[j][i] < 0 else int(rows[j][i])) for j, field in enumerate(_FIELDS)
+        }
+    return skills
+
+
+def _pad(rows, width):
+    # Widen a (fields, n) array with the "-1" sentinel, e.g. for skills added later
+    if rows.shape[1] >= width:
+        return rows[:, :width]
+    return np.pad(rows, ((0, 0), (0, width - rows.shape[1])), constant_values=-1)
+
+
+def encode_arrays(skill_rows, activity_rows=None):
+    """Pack (3, n) skill and (2, m) activity arrays, e.g. from hiscores.parse_batch."""
+    skill_rows = np.asarray(skill_rows, dtype=np.int64)
+    if activity_rows is None:
+        activity_rows = np.zeros((2, 0), dtype=np.int64)
+    activity_rows = np.asarray(activity_rows, dtype=np.int64)
+
+    payload = skill_rows.astype("<i8").tobytes() + activity_rows.astype("<i8").tobytes()
+    header = _HEADERS[FORMAT_VERSION].pack(FORMAT_VERSION, 0, skill_rows.shape[1], activity_rows.shape[1])
+    return header + zlib.compress(payload)
+
+
+def encode(skills, activities=None):
+    """Pack a parsed skills dict.
+
+    ``activities`` is an optional (2, len(ACTIVITIES)) rank/score array.
+    """
+    return encode_arrays(np.array(skills_to_rows(skills)), activities)
+
+
+def _unpack(blob):
+    version = blob[0]
+    header = _HEADERS.get(version)
+    if header is None:
+        raise ValueError(f"Unsupported snapshot format version {version}")
+    fields = header.unpack_from(blob)
+    flags, skill_count = fields[1], fields[2]
+    if flags:
+        raise ValueError(f"Unsupported snapshot flags {flags:#x}")
+    activity_count = fields[3] if version >= 2 else 0
+
+    values = np.frombuffer(zlib.decompress(memoryview(blob)[header.size:]), dtype="<i8")
+    skills = values[:3 * skill_count].reshape(len(_FIELDS), skill_count)
+    activities = values[3 * skill_count:].reshape(2, activity_count)
+    return skills, activities
+
+
+def decode_array(blob):
+    """Return a (3, n_skills) int64 array of rank/level/xp."""
+    return _unpack(blob)[0]
+
+
+def decode_activities(blob):
+    """Return a (2, n_activities) int64 array of rank/score (empty for version 1 blobs)."""
+    return _unpack(blob)[1]
+
+
+def kill_counts(blob):
+    return {
+        name: int(score) for name, score in zip(ACTIVITIES, decode_activities(blob)[1]) if score >= 0
+    }
+
+
+def decode(blob):
+    return rows_to_skills(decode_array(blob).tolist())
+
+
+def decode_history(blobs):
+    """Decode an ordered run of snapshots into one (n, 3, n_skills) array.
+
+    Blobs written with fewer skills are padded with -1. Plot-ready slices are
+    e.g. ``history[:, 2, SKILLS.index("Attack")]``.
+    """
+    decoded = [decode_array(blob) for blob in blobs]
+    if not decoded:
+        return np.zeros((0, len(_FIELDS), len(SKILLS)), dtype=np.int64)
+
+    width = max(d.shape[1] for d in decoded)
+    return np.stack([_pad(d, width) for d in decoded])
+
+
+def pack_array(values):
+    # Single int64 vector (e.g. per-skill XP gains), same compression as snapshots
+    return zlib.compress(_to_le_bytes(values))
+
+
+def unpack_array(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype="<i8")
@@ -0,0 +1,26 @@
+# tests/conftest.py
+#
+# The tests share bench/_common.py with the benchmarks: its setup, its seed
+# data and bench/fake_discord.py. Unlike a benchmark they never run against a
+# configured database, since they delete every queue.
+
+import os
+import sys
+import tempfile
+
+BENCH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench")
+sys.path.insert(0, BENCH)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "tests.db")
+
+import _common
+import pytest
+
+from db import engine
+
+
+@pytest.fixture
+def database():
+    # An empty schema
+    _common.create_schema(engine)
+    with engine.begin() as conn:
+        _common.clear(conn)
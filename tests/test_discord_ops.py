@@ -0,0 +1,119 @@
+# tests/test_discord_ops.py
+#
+# discord_ops.OutboundQueue against the fake API of bench/fake_discord.py:
+# coalescing, priorities, discard, and how 429s are retried per bucket.
+#
+#   python -m pytest -q tests
+
+import asyncio
+
+import pytest
+
+import fake_discord
+from discord_ops import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, OutboundQueue
+
+
+def call(api, result, log=None):
+    # An op that makes one API call, then records ``result`` in ``log``
+    async def op():
+        await api.call("edit")
+        if log is not None:
+            log.append(result)
+        return result
+
+    return op
+
+
+def test_pending_edits_with_one_key_coalesce():
+    api = fake_discord.FakeAPI()
+
+    async def run():
+        outbound = OutboundQueue()
+        futures = [outbound.submit("channel", call(api, n), key="message") for n in range(3)]
+        return outbound, await asyncio.gather(*futures)
+
+    outbound, results = asyncio.run(run())
+    # Only the newest edit ran, and every caller got its result
+    assert results == [2, 2, 2]
+    assert api.calls["edit"] == 1
+    assert outbound.stats["coalesced"] == 2
+
+
+def test_ops_in_a_bucket_run_by_priority():
+    api = fake_discord.FakeAPI()
+    order = []
+
+    async def run():
+        outbound = OutboundQueue()
+        for name, priority in (("footer", PRIORITY_LOW), ("edit", PRIORITY_NORMAL), ("ping", PRIORITY_HIGH),
+                               ("edit 2", PRIORITY_NORMAL)):
+            outbound.submit("channel", call(api, name, order), priority=priority)
+        await outbound.drain()
+
+    asyncio.run(run())
+    assert order == ["ping", "edit", "edit 2", "footer"]
+
+
+def test_discard_resolves_callers_with_none():
+    api = fake_discord.FakeAPI()
+
+    async def run():
+        outbound = OutboundQueue()
+        future = outbound.submit("channel", call(api, "edit"), key="message")
+        discarded = outbound.discard("channel", "message")
+        return discarded, outbound.discard("channel", "message"), await future
+
+    discarded, again, result = asyncio.run(run())
+    assert discarded and not again
+    assert result is None
+    assert api.calls["edit"] == 0
+
+
+def test_rate_limit_pauses_only_its_bucket():
+    retry_after = 0.2
+    limited = fake_discord.FakeAPI(rate_limit=1.0, retry_after=retry_after)
+    other = fake_discord.FakeAPI()
+    finished = {}
+
+    async def limited_once():
+        try:
+            await limited.call("edit")
+        finally:
+            limited.rate_limit = 0
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        began = loop.time()
+        outbound = OutboundQueue()
+
+        async def timed(name, op):
+            await op
+            finished[name] = loop.time() - began
+
+        await asyncio.gather(
+            timed("limited", outbound.submit("channel 1", limited_once)),
+            timed("other", outbound.submit("channel 2", call(other, "edit"))),
+        )
+        return outbound
+
+    outbound = asyncio.run(run())
+    assert limited.rate_limited["edit"] == 1 and limited.calls["edit"] == 2
+    # The other channel did not wait; the limited one retried once retry_after had passed
+    assert finished["other"] < retry_after
+    assert finished["limited"] >= retry_after
+    assert outbound.stats["rate_limited"] == 1 and outbound.stats["failed"] == 0
+
+
+def test_ops_fail_after_max_attempts():
+    api = fake_discord.FakeAPI(rate_limit=1.0, retry_after=0.01)
+
+    async def run():
+        outbound = OutboundQueue(max_attempts=3)
+        future = outbound.submit("channel", call(api, "edit"))
+        with pytest.raises(fake_discord.FakeRateLimited):
+            await future
+        return outbound
+
+    outbound = asyncio.run(run())
+    assert api.calls["edit"] == 3
+    assert outbound.stats["rate_limited"] == 2 and outbound.stats["failed"] == 1
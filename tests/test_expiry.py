@@ -0,0 +1,60 @@
+# tests/test_expiry.py
+#
+# ExpiryScheduler.next_minute_change keeps a heap of footer changes; it must
+# agree with a plain pass over every queue while queues come, go and expire.
+#
+#   python -m pytest -q tests
+
+import random
+from datetime import datetime, timedelta
+
+from expiry import ExpiryScheduler
+
+
+def scan(due, after, window):
+    # Every queue's next footer change after ``after``, computed from scratch
+    changes = []
+    for queue_id, expires_at in due.items():
+        left = (expires_at - after).total_seconds()
+        if left <= 0:
+            changes.append((expires_at, queue_id))
+        else:
+            step = left % 60
+            changes.append((after + timedelta(seconds=step if step >= 0.001 else step + 60), queue_id))
+    if not changes:
+        return None, []
+    cutoff = min(changes)[0] + timedelta(seconds=window)
+    due = [(when, queue_id) for when, queue_id in changes if when <= cutoff]
+    return max(due)[0], sorted(queue_id for _, queue_id in due)
+
+
+def test_next_minute_change_matches_a_full_scan():
+    rng = random.Random(0)
+    start = datetime(2026, 1, 1)
+    scheduler = ExpiryScheduler()
+    expiries = {q: start + timedelta(seconds=rng.uniform(-5, 600)) for q in range(30)}
+    scheduler.hydrate(expiries.items())
+    after = start
+    for _ in range(2000):
+        r = rng.random()
+        if r < 0.1:
+            queue_id = rng.randint(0, 40)
+            expiries[queue_id] = after + timedelta(seconds=rng.uniform(-5, 600))
+            scheduler.schedule(queue_id, expiries[queue_id])
+        elif r < 0.15:
+            queue_id = rng.randint(0, 40)
+            expiries.pop(queue_id, None)
+            scheduler.cancel(queue_id)
+        elif r < 0.2:
+            for queue_id in scheduler.pop_due(after):
+                del expiries[queue_id]
+        window = rng.choice((0.0, 0.5, 2.0))
+
+        when, queue_ids = scheduler.next_minute_change(after, window)
+        assert (when, sorted(queue_ids)) == scan(expiries, after, window)
+
+        # Mostly wake right on time, sometimes late
+        if when is not None and when > after:
+            after = when if rng.random() < 0.8 else when + timedelta(seconds=rng.uniform(0, 5))
+        else:
+            after += timedelta(seconds=rng.uniform(0, 3))
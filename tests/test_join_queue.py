@@ -0,0 +1,67 @@
+# tests/test_join_queue.py
+#
+# queue_ops.join_queue from many threads at once against one small queue
+# (bench/stress_join.py at test size): it must never overfill or duplicate
+# members, and members pressing Join again hear DUPLICATE, not FULL.
+#
+#   python -m pytest -q tests
+
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import _common
+from sqlalchemy import select
+
+from db import SessionLocal, engine
+from models import QueueMember
+from queue_ops import JoinResult, join_queue
+
+GROUP_SIZE = 5
+ATTEMPTS = 50
+THREADS = 8
+
+
+def test_concurrent_joins_never_overfill(database):
+    with engine.begin() as conn:
+        _common.insert_queues(conn, 1, 0, group_size=GROUP_SIZE)
+    # 30 distinct ids, the first GROUP_SIZE of them pressing Join again and again
+    ids = [f"joiner-{i}" for i in range(30)] + [f"joiner-{i % GROUP_SIZE}" for i in range(ATTEMPTS - 30)]
+    random.Random(0).shuffle(ids)
+    start_gate = threading.Barrier(THREADS)
+
+    def attempt(discord_id):
+        try:
+            start_gate.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        db = SessionLocal()
+        try:
+            return discord_id, join_queue(db, 1, discord_id, discord_id).result
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        outcomes = defaultdict(list)
+        for discord_id, result in pool.map(attempt, ids):
+            outcomes[discord_id].append(result)
+
+    with engine.connect() as conn:
+        members = conn.execute(select(QueueMember.discord_id).where(QueueMember.queue_id == 1)).scalars().all()
+    assert len(members) == GROUP_SIZE
+    assert len(set(members)) == len(members)
+    for discord_id, results in outcomes.items():
+        if discord_id in members:
+            # Joined once; every other press, also on the full queue, was a re-join
+            assert results.count(JoinResult.JOINED) == 1
+            assert set(results) <= {JoinResult.JOINED, JoinResult.DUPLICATE}
+        else:
+            assert set(results) == {JoinResult.FULL}
+
+    db = SessionLocal()
+    try:
+        assert join_queue(db, 1, members[0], members[0]).result is JoinResult.DUPLICATE
+        assert join_queue(db, 1, "latecomer", "latecomer").result is JoinResult.FULL
+    finally:
+        db.close()
@@ -0,0 +1,118 @@
+# tests/test_sync_tick.py
+#
+# sync_tick against bench/fake_discord.py on a throwaway SQLite database:
+# the SQL it issues must not grow with the number of queues, and ids of
+# messages already posted must survive a send that fails partway.
+#
+#   python -m pytest -q tests
+
+import asyncio
+
+import _common
+import pytest
+from sqlalchemy import insert, select
+
+import bot
+import fake_discord
+from db import count_statements, engine
+from discord_ops import OutboundQueue
+from models import Queue, QueueMember
+
+MEMBERS = 3
+
+
+def seed(queues, expired=0, full=0):
+    # ``queues`` unposted queues; the last ``expired`` have expired, the first ``full`` are full
+    with engine.begin() as conn:
+        _common.clear(conn)
+        _common.insert_queues(conn, queues, MEMBERS, full=range(1, full + 1),
+                              expired=range(queues - expired + 1, queues + 1))
+
+
+@pytest.fixture(autouse=True)
+def fresh_bot(database):
+    # Module state from an earlier test (and its event loop) must not leak in
+    bot.outbound = OutboundQueue()
+    bot.queue_fingerprints.clear()
+    bot.lost_messages.clear()
+    yield fake_discord.install(bot)
+
+
+async def tick():
+    with count_statements() as statements:
+        await bot.sync_tick()
+        await bot.outbound.drain()
+    return statements["count"]
+
+
+def tick_statements(queues):
+    # SQL of a tick that posts, VCs and archives, then of one with nothing to do
+    seed(queues, expired=queues // 10, full=queues // 10)
+    bot.queue_fingerprints.clear()
+
+    async def run():
+        return await tick(), await tick()
+
+    return asyncio.run(run())
+
+
+def test_statements_per_tick_do_not_grow_with_queues():
+    assert tick_statements(10) == tick_statements(500)
+
+
+def test_posted_ids_survive_a_failed_send(fresh_bot):
+    channel = fresh_bot.channels[bot.LFG_CHANNEL_ID]
+    send = channel.send
+    sends = 0
+
+    async def flaky_send(*args, **kwargs):
+        nonlocal sends
+        sends += 1
+        if sends == 3:
+            raise RuntimeError("500 Internal Server Error")
+        return await send(*args, **kwargs)
+
+    channel.send = flaky_send
+    seed(5, full=1)
+
+    async def run():
+        await tick()
+        first = list(channel.sent)
+        await tick()
+        return first
+
+    posted_first = asyncio.run(run())
+
+    with engine.connect() as conn:
+        stored = dict(conn.execute(select(Queue.id, Queue.discord_message_id)).all())
+    # Queue 1's post and its "Queue Full!" ping went out before the failure and are kept
+    assert stored[1] == str(posted_first[0])
+    assert len(fresh_bot.guild.voice_channels) == 1
+    # The retry posts only what is still missing: queues 2-5, once each
+    assert len(channel.sent) == len(set(stored.values())) + 1
+    assert all(stored.values())
+
+
+def test_failed_edit_is_retried_next_tick(fresh_bot, monkeypatch):
+    channel = fresh_bot.channels[bot.LFG_CHANNEL_ID]
+    seed(3)
+    edit = fake_discord.FakeMessage.edit
+    failures = []
+
+    async def failing_once(self, **kwargs):
+        if not failures:
+            failures.append(self.id)
+            raise RuntimeError("503 Service Unavailable")
+        return await edit(self, **kwargs)
+
+    async def run():
+        await tick()
+        with engine.begin() as conn:
+            conn.execute(insert(QueueMember).values(queue_id=2, discord_id="999", rsn="Joiner"))
+        monkeypatch.setattr(fake_discord.FakeMessage, "edit", failing_once)
+        await tick()
+        await tick()
+
+    asyncio.run(run())
+    # The first edit of queue 2 failed; the next tick tried again instead of skipping it
+    assert failures and channel.edits[failures[0]] == 1
@@ -0,0 +1,22 @@
+# web_db.py
+#
+# One SQLAlchemy session per Flask request, opened on first use and closed in
+# teardown whatever the handler did.
+
+from flask import g
+
+from db import SessionLocal
+
+
+def get_db():
+    if "db" not in g:
+        g.db = SessionLocal()
+    return g.db
+
+
+def init_app(app):
+    @app.teardown_appcontext
+    def close_db(exc):
+        db = g.pop("db", None)
+        if db is not None:
+            db.close()